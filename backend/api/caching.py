@@ -0,0 +1,56 @@
+"""Кеш ответов для анонимных пользователей.
+
+Ответ хранится по адресу запроса и формату ответа. В ключ входит
+поколение данных: сигналы меняют его при изменении рецептов, тегов,
+ингредиентов и авторов, и старые ответы больше не находятся. Ленты по
+популярности хранятся коротко: счетчики обновляются без смены поколения.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from app.snapshots import response_generation
+
+
+# Порядки ленты по очкам популярности: очки меняются без смены поколения
+VOLATILE_ORDERINGS = ('popular', 'trending')
+
+
+def response_cache_timeout(request):
+    if request.query_params.get('ordering') in VOLATILE_ORDERINGS:
+        return settings.RESPONSE_CACHE_VOLATILE_TIMEOUT
+    return settings.RESPONSE_CACHE_TIMEOUT
+
+
+def response_cache_key(request):
+    url = request.build_absolute_uri()
+    digest = hashlib.md5(
+        f'{url}|{request.accepted_media_type}'.encode()).hexdigest()
+    return f'response:{response_generation.current_version()}:{digest}'
+
+
+def cache_for_anonymous(handler):
+    """Кеширует успешные ответы метода вьюсета для анонимов"""
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(self, request, *args, **kwargs)
+        key = response_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = handler(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            response.add_post_render_callback(
+                lambda rendered: cache.set(
+                    key, (rendered.content, rendered['Content-Type']),
+                    response_cache_timeout(request)))
+        response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
@@ -0,0 +1,95 @@
+import base64
+import binascii
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import (TemporaryUploadedFile,
+                                            UploadedFile)
+from rest_framework import serializers
+
+from app.images import inspect_image, placeholder_url, thumbnail_url
+
+
+def decode_base64(data):
+    """Раскодирует data URL кусками во временный файл на диске.
+
+    Раскодированная картинка целиком в памяти не держится, при сохранении
+    файловое хранилище переносит временный файл на место без копирования.
+    """
+    content_type = None
+    if ';base64,' in data:
+        header, data = data.split(';base64,', 1)
+        content_type = header.replace('data:', '')
+    # b64decode пропускает переводы строк, и в строке с переносами куски
+    # сбились бы с границы 4 символов
+    data = ''.join(data.split())
+    file = TemporaryUploadedFile(
+        'upload', content_type, size=0, charset=None)
+    # Кратно 4 символам, чтобы куски раскодировались независимо
+    chunk = settings.RECIPE_IMAGE_DECODE_CHUNK // 4 * 4
+    try:
+        for start in range(0, len(data), chunk):
+            file.write(base64.b64decode(data[start:start + chunk]))
+    except (binascii.Error, ValueError):
+        file.close()
+        raise serializers.ValidationError('Некорректная строка base64')
+    file.size = file.tell()
+    file.seek(0)
+    return file
+
+
+class RecipeImageField(serializers.ImageField):
+    """Картинка рецепта: data URL в base64 или файл из multipart.
+
+    В запросе картинка только проверяется по заголовку, пережатие и
+    миниатюры делаются в фоне. При чтении отдается ссылка на миниатюру
+    thumbnail, пока ее нет - на заглушку. С lists_only миниатюра отдается
+    только в списках, а отдельный рецепт получает оригинал.
+    """
+
+    def __init__(self, *args, thumbnail=None, lists_only=False, **kwargs):
+        self.thumbnail = thumbnail
+        self.lists_only = lists_only
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        if data in (None, ''):
+            return None
+        if isinstance(data, str):
+            # Строка base64 на треть длиннее файла, проверяем до раскодирования
+            max_size = settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+            if len(data) * 3 // 4 > max_size + 1024:
+                raise serializers.ValidationError(
+                    'Размер изображения больше '
+                    f'{max_size // (1024 * 1024)} МБ')
+            data = decode_base64(data)
+        elif not isinstance(data, UploadedFile):
+            raise serializers.ValidationError(
+                'Ожидается файл или строка base64')
+        try:
+            extension = inspect_image(data)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.messages)
+        data.name = f'{uuid.uuid4()}.{extension}'
+        return data
+
+    def to_representation(self, file):
+        if not file or not self.use_thumbnail():
+            return super().to_representation(file)
+        if getattr(file.instance, 'image_processed', True):
+            url = thumbnail_url(file.name, self.thumbnail)
+        else:
+            url = placeholder_url()
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def use_thumbnail(self):
+        if self.thumbnail is None:
+            return False
+        if not self.lists_only:
+            return True
+        return isinstance(
+            getattr(self.parent, 'parent', None), serializers.ListSerializer)
@@ -1,23 +1,111 @@
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import (Case, Exists, IntegerField, OuterRef, Q, Value,
+                              When)
+from django.db.models.functions import Lower
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
 from app.models import Recipe
+from app.search import search_recipes
+from app.snapshots import tag_slugs
+
+EXACT, PREFIX, FUZZY = range(3)
+
+# Порядок ленты по ?ordering=. Ключи popular и trending уникальны
+# (см. app.popularity), поэтому годятся и для курсорной пагинации
+RECIPE_ORDERINGS = {
+    'new': ('-pub_date', '-id'),
+    'popular': ('-popular_rank',),
+    'trending': ('-trending_rank',),
+}
 
 
 class IngredientSearchFilter(SearchFilter):
+    """Поиск ингредиентов по началу названия без учета регистра.
+
+    Сначала идет точное совпадение, затем совпадения по началу названия,
+    на PostgreSQL после них - похожие названия по триграммам (опечатки).
+    Префикс ищется по индексу lower(name) text_pattern_ops.
+    """
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        query = ' '.join(terms).lower()
+        fuzzy = (
+            settings.INGREDIENT_SEARCH_FUZZY
+            and connection.vendor == 'postgresql'
+        )
+        matches = Q(name_lower__startswith=query)
+        ordering = ['rank', 'name']
+        queryset = queryset.annotate(name_lower=Lower('name'))
+        if fuzzy:
+            matches |= Q(name__trigram_similar=query)
+            queryset = queryset.annotate(
+                similarity=TrigramSimilarity('name', query))
+            ordering.insert(1, '-similarity')
+        return queryset.filter(matches).annotate(
+            rank=Case(
+                When(name_lower=query, then=Value(EXACT)),
+                When(name_lower__startswith=query, then=Value(PREFIX)),
+                default=Value(FUZZY),
+                output_field=IntegerField(),
+            )
+        ).order_by(*ordering)[:settings.INGREDIENT_SEARCH_LIMIT]
+
+
+class RecipeSearchFilter(SearchFilter):
+    """Полнотекстовый поиск рецептов по ?search=, см. app.search.
+
+    Результаты идут по убыванию релевантности, если порядок не задан
+    через ?ordering=. Курсорная пагинация сохраняет порядок ленты.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        queryset = search_recipes(queryset, ' '.join(terms))
+        if 'ordering' in request.query_params:
+            return queryset
+        return queryset.order_by('-rank', '-id')
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_slugs.get()]
+
 
 class RecipeFilter(FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method='filter_tags')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=[(key, key) for key in RECIPE_ORDERINGS],
+        method='filter_ordering')
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'ordering')
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов, без размножения строк JOIN"""
+        if not value:
+            return queryset
+        slugs = tag_slugs.get()
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'),
+                tag_id__in=[slugs[slug] for slug in value if slug in slugs],
+            )
+        ))
 
     def filter_is_favorited(self, queryset, name, value):
         if value:
@@ -28,3 +116,6 @@ class RecipeFilter(FilterSet):
         if value:
             return queryset.filter(purchases__user=self.request.user)
         return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
@@ -0,0 +1,25 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from api.filter import RECIPE_ORDERINGS
+
+
+class LimitPageNumberPagination(PageNumberPagination):
+    """Постраничная пагинация с размером страницы из ?limit="""
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Пагинация ленты рецептов по курсору.
+
+    Следующая страница выбирается условием по (pub_date, id) без
+    OFFSET и без COUNT(*) по всей выборке. С ?ordering=popular или
+    trending - условием по уникальному ключу популярности.
+    """
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        return RECIPE_ORDERINGS.get(
+            request.query_params.get('ordering'), self.ordering)
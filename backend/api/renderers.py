@@ -0,0 +1,36 @@
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ExportRenderer(BaseRenderer):
+    """Рендерер для выгрузок.
+
+    Сами файлы отдаются готовым ответом, ошибки вьюха переводит на
+    JSONRenderer (см. RecipeViewSet.handle_exception).
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+class PDFRenderer(ExportRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class PlainTextRenderer(ExportRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+SHOPPING_RENDERERS = (PDFRenderer, PlainTextRenderer, CSVRenderer,
+                      JSONRenderer)
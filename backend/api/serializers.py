@@ -1,10 +1,28 @@
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from users.models import User
 
+from api.fields import RecipeImageField
+from app.cook_index import cook_index
 from app.models import (Favorite, Ingredient, Recipe, RecipeIngredientAmount,
-                        Shopping, Subscription, Tag)
+                        ShoppingExport, Subscription, Tag)
+from app.servises import SHOPPING_FORMATS, forget_recipe_shopping_lists
+from app.tasks import process_recipe_image, submit
+from app.user_state import get_user_state
+
+
+def get_recipes_limit(request):
+    """Значение ?recipes_limit= или None, если параметр не задан"""
+    if request is None:
+        return None
+    try:
+        limit = int(request.query_params.get('recipes_limit', ''))
+    except ValueError:
+        return None
+    return limit if limit >= 0 else None
 
 
 class CustomUserSerializer(UserSerializer):
@@ -17,11 +35,11 @@ class CustomUserSerializer(UserSerializer):
                   )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return Subscription.objects.filter(
-            user=request.user, author=obj).exists()
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
+        return obj.id in get_user_state(
+            self.context.get('request')).following
 
 
 class IngredientCreateSerializer(serializers.ModelSerializer):
@@ -70,8 +88,12 @@ class TagsCreateSerializer(serializers.ModelSerializer):
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField(read_only=True)
-    ingredients = IngredientCreateSerializer(many=True)
-    image = Base64ImageField(required=True)
+    # Список id вместо PrimaryKeyRelatedField: тот ищет каждый тег
+    # отдельным запросом, здесь все проверяются одним in_bulk
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False)
+    ingredients = IngredientCreateSerializer(many=True, allow_empty=False)
+    image = RecipeImageField(required=True)
     cooking_time = serializers.IntegerField(required=True)
 
     class Meta:
@@ -81,76 +103,147 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                   'cooking_time'
                   )
 
-    def validate(self, data):
-        ingredients = data['ingredients']
-        ingredients_list = []
+    def validate_tags(self, tags):
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError('Тэги не уникальны!')
+        found = Tag.objects.in_bulk(tags)
+        missing = [tag for tag in tags if tag not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Тэги не найдены: {", ".join(map(str, missing))}')
+        return tags
+
+    def validate_ingredients(self, ingredients):
+        ids = [ingredient['id'] for ingredient in ingredients]
+        found = Ingredient.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {", ".join(map(str, missing))}')
+        seen = set()
         for ingredient in ingredients:
-            ingredient_id = ingredient['id']
-            if ingredient_id in ingredients_list:
-                name = Ingredient.objects.get(pk=ingredient['id']).name
+            if ingredient['id'] in seen:
                 raise serializers.ValidationError(
-                    f'{name} уже есть в ингредиентах')
-            if int(ingredient["amount"]) < 1:
+                    f'{found[ingredient["id"]].name} уже есть в ингредиентах')
+            if int(ingredient['amount']) < 1:
                 raise serializers.ValidationError(
-                    "Количество не может быть меньше 1"
+                    'Количество не может быть меньше 1'
                 )
-            ingredients_list.append(ingredient_id)
-        tags = data['tags']
-        tags_list = []
-        for tag in tags:
-            if tag in tags_list:
-                raise serializers.ValidationError('Тэги не уникальны!')
-            tags_list.append(tag)
-
-        cooking_time = data['cooking_time']
-        if int(cooking_time) <= 0:
+            seen.add(ingredient['id'])
+        return ingredients
+
+    def validate(self, data):
+        cooking_time = data.get('cooking_time')
+        if cooking_time is not None and int(cooking_time) <= 0:
             raise serializers.ValidationError(
                 'Проверьте время приготовления рецепта! (меньше 1)'
             )
         return data
 
-    def create_ingredients(self, ingredients, recipe):
-        ingredients_result = []
-        """Метод для добавления ингредиентов"""
-        for ingredient in ingredients:
-            current_ingredient = Ingredient.objects.get(id=ingredient['id'])
-            obj = RecipeIngredientAmount(
-                recipe=recipe,
-                ingredient=current_ingredient,
-                amount=ingredient['amount']
-            )
-            ingredients_result.append(obj)
-        RecipeIngredientAmount.objects.bulk_create(ingredients_result)
-
+    def save_ingredients(self, recipe, ingredients):
+        """Приводит ингредиенты рецепта к присланным минимальным числом
+        запросов: добавляет новые, меняет количество, удаляет лишние"""
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        existing = {
+            row.ingredient_id: row
+            for row in recipe.recipe_ingredients.all()
+        }
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        removed = [
+            row.id for ingredient_id, row in existing.items()
+            if ingredient_id not in amounts
+        ]
+        added = [
+            RecipeIngredientAmount(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ]
+        if removed:
+            RecipeIngredientAmount.objects.filter(id__in=removed).delete()
+        if changed:
+            RecipeIngredientAmount.objects.bulk_update(changed, ('amount',))
+        if added:
+            RecipeIngredientAmount.objects.bulk_create(added)
+        if removed or changed or added:
+            # Массовые операции не шлют сигналы, версию рецепта для кеша
+            # списков покупок меняем сами, после фиксации транзакции
+            transaction.on_commit(
+                lambda: forget_recipe_shopping_lists([recipe.id]))
+        if removed or added:
+            transaction.on_commit(lambda: cook_index.changed([recipe.id]))
+
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Временный файл с картинкой хранилище уже перенесло,
+            # закрываем его сами: он создан не обработчиком загрузок Django
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        tags = self.initial_data.get('tags')
         recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        self.create_ingredients(ingredients, recipe)
+        through = Recipe.tags.through
+        through.objects.bulk_create(
+            [through(recipe=recipe, tag_id=tag) for tag in tags])
+        RecipeIngredientAmount.objects.bulk_create([
+            RecipeIngredientAmount(
+                recipe=recipe,
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount'],
+            )
+            for ingredient in ingredients
+        ])
+        transaction.on_commit(lambda: cook_index.changed([recipe.id]))
+        self.schedule_thumbnails(recipe)
         return recipe
 
     def to_representation(self, value):
-        serializer = RecipeSerializer(value, context=self.context)
+        # Ответ собирается тем же запросом, что и в ленте, без N+1
+        request = self.context.get('request')
+        recipe = Recipe.objects.with_related().with_user_flags(
+            request.user if request else None).get(pk=value.pk)
+        serializer = RecipeSerializer(recipe, context=self.context)
         return serializer.data
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        instance.ingredients.clear()
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.get(id=instance.id)
-        recipe.tags.set(tags)
-        self.create_ingredients(ingredients, recipe)
-        return super().update(instance, validated_data)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self.save_ingredients(instance, ingredients)
+        if 'image' in validated_data:
+            validated_data['image_processed'] = False
+        recipe = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            self.schedule_thumbnails(recipe)
+        return recipe
+
+    def schedule_thumbnails(self, recipe):
+        if recipe.image:
+            submit(process_recipe_image, recipe.id)
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = RecipeImageField(thumbnail='medium', lists_only=True)
     ingredients = IngredientSerializer(
         read_only=True, many=True, source='recipe_ingredients')
     tags = TagSerializer(many=True,)
@@ -164,18 +257,44 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'text', 'cooking_time'
                   )
 
+    def to_representation(self, instance):
+        author_is_subscribed = getattr(
+            instance, 'author_is_subscribed', None)
+        if author_is_subscribed is not None:
+            instance.author.is_subscribed = author_is_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return Favorite.objects.filter(user=request.user, recipe=obj).exists()
+        is_favorited = getattr(obj, 'is_favorited', None)
+        if is_favorited is not None:
+            return is_favorited
+        return obj.id in get_user_state(
+            self.context.get('request')).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return Shopping.objects.filter(
-            user=request.user, recipe=obj).exists()
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
+        return obj.id in get_user_state(self.context.get('request')).cart
+
+
+class CookableRecipeSerializer(RecipeSerializer):
+    """Рецепт в подборе по ингредиентам: доля имеющихся ингредиентов
+    и сколько не хватает"""
+    coverage = serializers.FloatField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('coverage', 'missing')
+
+
+class WhatToCookSerializer(serializers.Serializer):
+    """Параметры подбора: id имеющихся ингредиентов и минимальная доля"""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        max_length=settings.WHAT_TO_COOK_MAX_INGREDIENTS)
+    min_coverage = serializers.FloatField(
+        min_value=0, max_value=1, default=0)
 
 
 class SignUpSerializer(serializers.Serializer):
@@ -222,7 +341,7 @@ class MeSerializer(serializers.ModelSerializer):
 
 class FavoriteSerializer(serializers.ModelSerializer):
     """Рецепт в избранное"""
-    image = Base64ImageField()
+    image = RecipeImageField(thumbnail='small')
     id = serializers.IntegerField(read_only=True)
     name = serializers.CharField(read_only=True)
     cooking_time = serializers.IntegerField(read_only=True)
@@ -237,7 +356,7 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
 
 
 class RecipesSer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = RecipeImageField(thumbnail='small')
     id = serializers.IntegerField(read_only=True)
     name = serializers.CharField(read_only=True)
     cooking_time = serializers.IntegerField(read_only=True)
@@ -255,7 +374,7 @@ class SubscriptionsUserSerializer(serializers.ModelSerializer):
     first_name = serializers.ReadOnlyField(source='author.first_name')
     last_name = serializers.ReadOnlyField(source='author.last_name')
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='recipe_count')
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -268,12 +387,17 @@ class SubscriptionsUserSerializer(serializers.ModelSerializer):
             )
 
     def get_recipes(self, obj):
-        recipe = obj.author.recipes_author.all()
-        return RecipesSer(recipe, many=True).data
+        recipes = getattr(obj.author, 'latest_recipes', None)
+        if recipes is None:
+            recipes = obj.author.recipes_author.all()
+            limit = get_recipes_limit(self.context.get('request'))
+            if limit is not None:
+                recipes = recipes[:limit]
+        return RecipesSer(recipes, many=True).data
 
     def get_is_subscribed(self, obj):
-        return Subscription.objects.filter(
-            user=obj.user, author=obj.author).exists()
+        # Объект сериализатора и есть подписка
+        return True
 
 
 class SubscriptionsCreateSerializer(serializers.ModelSerializer):
@@ -281,3 +405,27 @@ class SubscriptionsCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscription
         fields = '__all__'
+
+
+class ShoppingExportSerializer(serializers.ModelSerializer):
+    """Фоновая выгрузка списка покупок"""
+    format = serializers.ChoiceField(
+        source='export_format', choices=tuple(SHOPPING_FORMATS),
+        default='pdf')
+    file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ShoppingExport
+        fields = ('id', 'format', 'status', 'file', 'error', 'created',
+                  'finished')
+        read_only_fields = ('status', 'error', 'created', 'finished')
+
+    def get_file(self, obj):
+        """Ссылка на скачивание через API, файл по прямой ссылке закрыт"""
+        if obj.status != ShoppingExport.DONE or not obj.file:
+            return None
+        url = reverse('api:shopping_cart_exports-download', args=(obj.id,))
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
@@ -2,8 +2,9 @@ from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
 from api.views import (FavoriteViewSet, IngredientViewSet, RecipeViewSet,
-                       ShoppingCartViewSet, SubscriptionsCreateViewSet,
-                       SubscriptionsUserViewSet, TagViewSet)
+                       ShoppingCartViewSet, ShoppingExportViewSet,
+                       SubscriptionsCreateViewSet, SubscriptionsUserViewSet,
+                       TagViewSet)
 
 app_name = 'api'
 
@@ -28,6 +29,9 @@ router.register(
     ShoppingCartViewSet,
     basename='shopping_carts',
 )
+router.register(
+    'shopping_cart_exports', ShoppingExportViewSet,
+    basename='shopping_cart_exports')
 urlpatterns = [
     path('', include(router.urls)),
     path('', include('djoser.urls')),
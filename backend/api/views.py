@@ -1,21 +1,35 @@
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import FileResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, mixins, status, viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 from users.models import User
 
+from api.caching import cache_for_anonymous
+from api.pagination import (LimitPageNumberPagination,
+                            RecipeCursorPagination)
 from api.permissions import OwnerOrAdmins
-from api.serializers import (FavoriteSerializer, IngredientListSerializer,
-                             RecipeCreateSerializer, RecipeSerializer,
-                             SubscriptionsUserSerializer, TagSerializer)
-from app.models import (Favorite, Ingredient, Recipe, Shopping, Subscription,
-                        Tag)
-from app.servises import download_shopping
+from api.renderers import SHOPPING_RENDERERS, ExportRenderer
+from api.serializers import (CookableRecipeSerializer, FavoriteSerializer,
+                             IngredientListSerializer, RecipeCreateSerializer,
+                             RecipeSerializer, ShoppingExportSerializer,
+                             SubscriptionsUserSerializer, TagSerializer,
+                             WhatToCookSerializer, get_recipes_limit)
+from app.cook_index import cook_index
+from app.ingredient_index import ingredient_index
+from app.models import (Favorite, Ingredient, Recipe, Shopping,
+                        ShoppingExport, Subscription, Tag)
+from app.servises import SHOPPING_FORMATS, download_shopping
+from app.tasks import enqueue_shopping_export
 
-from .filter import IngredientSearchFilter, RecipeFilter
+from .filter import IngredientSearchFilter, RecipeFilter, RecipeSearchFilter
 
 
 class CreateDeleteShopping(mixins.CreateModelMixin, mixins.DestroyModelMixin,
@@ -95,7 +109,8 @@ class CreateDeleteSubscriptions(mixins.CreateModelMixin,
             raise ValidationError([
                 'Нельзя подписаться на самого себя'])
         follow = Subscription.objects.create(user=request.user, author=author)
-        serializer = SubscriptionsUserSerializer(follow)
+        serializer = SubscriptionsUserSerializer(
+            follow, context=self.get_serializer_context())
         return Response(
             serializer.data,
             status=status.HTTP_201_CREATED,
@@ -120,20 +135,68 @@ class TagViewSet(viewsets.ModelViewSet):
     serializer_class = TagSerializer
     pagination_class = None
 
+    @cache_for_anonymous
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_for_anonymous
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class IngredientViewSet(viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientListSerializer
     filter_backends = [IngredientSearchFilter]
-    search_fields = ('^name',)
     pagination_class = None
 
+    @cache_for_anonymous
+    def list(self, request, *args, **kwargs):
+        """Подсказки по началу названия отдаются из индекса в памяти"""
+        name = request.query_params.get(IngredientSearchFilter.search_param)
+        if name and name.strip():
+            found = ingredient_index.get().search(
+                name, settings.INGREDIENT_SEARCH_LIMIT)
+            if found:
+                return Response(found)
+        return super().list(request, *args, **kwargs)
+
+    @cache_for_anonymous
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     filterset_class = RecipeFilter
     serializer_class = RecipeSerializer
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)
+    filter_backends = (DjangoFilterBackend, RecipeSearchFilter)
+
+    @property
+    def paginator(self):
+        """Курсорная пагинация по ?pagination=cursor, иначе постраничная"""
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params if self.request else {}
+            if (params.get('pagination') == 'cursor'
+                    or RecipeCursorPagination.cursor_query_param in params):
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = LimitPageNumberPagination()
+        return self._paginator
+
+    @cache_for_anonymous
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_for_anonymous
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = Recipe.objects.with_related()
+        if self.action in ('list', 'retrieve'):
+            return queryset.with_user_flags(self.request.user)
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -145,11 +208,66 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeCreateSerializer
         return RecipeCreateSerializer
 
+    def handle_exception(self, exc):
+        """Ошибки выгрузок отдаются в JSON, а не под типом файла"""
+        if isinstance(getattr(self.request, 'accepted_renderer', None),
+                      ExportRenderer):
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
     @action(detail=False, methods=['get'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_RENDERERS)
     def download_shopping_cart(self, request):
+        """Список покупок в формате pdf, txt, csv или json.
+
+        Формат выбирается параметром ?format= или заголовком Accept.
+        """
         return download_shopping(self, request)
 
+    @action(detail=False, methods=['get'])
+    @cache_for_anonymous
+    def what_to_cook(self, request):
+        """Рецепты по имеющимся ингредиентам, по убыванию доли покрытия.
+
+        ?ingredients=1,2,3 (или несколько ?ingredients=), необязательный
+        ?min_coverage= от 0 до 1. Подбор идет по индексу в памяти, из базы
+        читается только текущая страница рецептов.
+        """
+        params = {
+            'ingredients': [
+                value.strip()
+                for values in request.query_params.getlist('ingredients')
+                for value in values.split(',') if value.strip()
+            ],
+        }
+        if 'min_coverage' in request.query_params:
+            params['min_coverage'] = request.query_params['min_coverage']
+        serializer = WhatToCookSerializer(data=params)
+        serializer.is_valid(raise_exception=True)
+        found = cook_index.get().search(
+            serializer.validated_data['ingredients'],
+            serializer.validated_data['min_coverage'],
+            settings.WHAT_TO_COOK_LIMIT,
+        )
+        paginator = LimitPageNumberPagination()
+        page = paginator.paginate_queryset(found, request, view=self)
+        recipes = Recipe.objects.with_related().with_user_flags(
+            request.user).in_bulk([recipe_id for recipe_id, *_ in page])
+        results = []
+        for recipe_id, coverage, count, total in page:
+            recipe = recipes.get(recipe_id)
+            # Рецепт могли удалить, пока индекс не обновился
+            if recipe is None:
+                continue
+            recipe.coverage = round(coverage, 4)
+            recipe.missing = total - count
+            results.append(recipe)
+        serializer = CookableRecipeSerializer(
+            results, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
 
 class FavoriteViewSet(CreateDeleteFavorite):
     serializer_class = FavoriteSerializer
@@ -161,6 +279,26 @@ class SubscriptionsUserViewSet(viewsets.ModelViewSet):
     queryset = Subscription.objects.all()
     permission_classes = (OwnerOrAdmins, )
 
+    def get_queryset(self):
+        """Подписки с авторами и последними рецептами.
+
+        Число рецептов хранится у автора. Последние рецепты берутся
+        одним запросом с оконной функцией на всю страницу авторов.
+        """
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        limit = get_recipes_limit(self.request)
+        if limit is not None:
+            recipes = recipes[:limit]
+        return Subscription.objects.filter(
+            user=self.request.user
+        ).select_related('author').prefetch_related(
+            Prefetch(
+                'author__recipes_author',
+                queryset=recipes,
+                to_attr='latest_recipes',
+            )
+        ).order_by('-id')
+
     def get_serializer_class(self):
         if self.action in ('list'):
             return SubscriptionsUserSerializer
@@ -176,3 +314,40 @@ class SubscriptionsCreateViewSet(CreateDeleteSubscriptions):
 class ShoppingCartViewSet(CreateDeleteShopping):
     serializer_class = FavoriteSerializer
     queryset = Shopping.objects.all()
+
+
+class ShoppingExportViewSet(mixins.CreateModelMixin,
+                            mixins.RetrieveModelMixin,
+                            viewsets.GenericViewSet):
+    """Фоновая выгрузка списка покупок.
+
+    POST ставит выгрузку в очередь и сразу возвращает её id,
+    GET по id отдаёт статус и ссылку на готовый файл,
+    GET .../download/ отдаёт сам файл только его владельцу.
+    """
+    serializer_class = ShoppingExportSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return ShoppingExport.objects.filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = enqueue_shopping_export(
+            request.user, serializer.validated_data['export_format'])
+        return Response(
+            self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ShoppingExport.DONE or not job.file:
+            raise NotFound('Выгрузка еще не готова')
+        _, content_type = SHOPPING_FORMATS[job.export_format]
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=f'Recipes.{job.export_format}',
+            content_type=content_type,
+        )
@@ -3,7 +3,8 @@ from itertools import chain
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredientAmount,
-                     Shopping, Subscription, Tag)
+                     Shopping, ShoppingExport, Subscription, Tag, Unit)
+from .tasks import process_recipe_image, submit
 
 
 class RecipeAmountAdmin(admin.TabularInline):
@@ -14,7 +15,7 @@ class RecipeAmountAdmin(admin.TabularInline):
 
 class RecipesAdmin(admin.ModelAdmin):
     def favorite_recipe(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
     favorite_recipe.short_description = 'Количество добавлений в избранное'
 
     def ingredient_name(self, obj):
@@ -41,15 +42,32 @@ class RecipesAdmin(admin.ModelAdmin):
     filter_horizontal = ['tags']
     inlines = (RecipeAmountAdmin,)
     empty_value_display = '-пусто-'
+    readonly_fields = ('image_processed',)
+
+    def save_model(self, request, obj, form, change):
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            obj.image_processed = False
+        super().save_model(request, obj, form, change)
+        if image_changed and obj.image:
+            submit(process_recipe_image, obj.id)
 
 
 class IngredientAdmin(admin.ModelAdmin):
-    list_display = ('name', 'measurement_unit')
+    list_display = ('name', 'measurement_unit', 'unit')
+    list_select_related = ('unit',)
     empty_value_display = '-пусто-'
     list_filter = ('name',)
     search_fields = ('name',)
 
 
+class UnitAdmin(admin.ModelAdmin):
+    list_display = ('name', 'base', 'factor')
+    list_select_related = ('base',)
+    empty_value_display = '-пусто-'
+    search_fields = ('name',)
+
+
 class TagsAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'slug', 'color')
     empty_value_display = '-пусто-'
@@ -57,9 +75,19 @@ class TagsAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 
+class ShoppingExportAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'export_format', 'status', 'file',
+                    'created', 'started', 'finished')
+    list_filter = ('status', 'export_format')
+    list_select_related = ('user',)
+    empty_value_display = '-пусто-'
+
+
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipesAdmin)
 admin.site.register(Tag, TagsAdmin)
+admin.site.register(Unit, UnitAdmin)
 admin.site.register(Favorite)
 admin.site.register(Subscription)
 admin.site.register(Shopping)
+admin.site.register(ShoppingExport, ShoppingExportAdmin)
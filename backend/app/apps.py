@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class AppConfig(AppConfig):
     name = 'app'
+
+    def ready(self):
+        from app import signals  # noqa: F401
+        from app.servises import register_fonts
+        register_fonts()
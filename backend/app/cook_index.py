@@ -0,0 +1,112 @@
+"""Подбор рецептов по ингредиентам, которые есть у пользователя.
+
+Обратный индекс в памяти процесса: ингредиент -> отсортированный массив id
+рецептов, где он есть. Доля покрытия рецепта считается подсчетом его
+вхождений в массивы выбранных ингредиентов, без JOIN по базе. При
+изменении состава рецептов индекс обновляется только по ним.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from app.models import RecipeIngredientAmount
+from app.snapshots import IncrementalSnapshot
+
+
+def compact(ids):
+    return array('I', sorted(set(ids)))
+
+
+class CookIndex:
+    """Обратный и прямой индексы состава рецептов"""
+
+    def __init__(self, postings, recipes):
+        # ингредиент -> id рецептов, рецепт -> id ингредиентов
+        self.postings = postings
+        self.recipes = recipes
+
+    @classmethod
+    def load(cls):
+        postings = {}
+        recipes = {}
+        rows = RecipeIngredientAmount.objects.order_by(
+            'recipe_id', 'ingredient_id'
+        ).values_list('recipe_id', 'ingredient_id').iterator(chunk_size=5000)
+        for recipe_id, ingredient_id in rows:
+            # Строки идут по возрастанию id рецепта, массивы уже отсортированы
+            ids = postings.setdefault(ingredient_id, array('I'))
+            if not ids or ids[-1] != recipe_id:
+                ids.append(recipe_id)
+            ingredients = recipes.setdefault(recipe_id, array('I'))
+            if not ingredients or ingredients[-1] != ingredient_id:
+                ingredients.append(ingredient_id)
+        return cls(postings, recipes)
+
+    def updated(self, recipe_ids):
+        """Копия индекса с составом рецептов recipe_ids из базы.
+
+        Копируются только словари и массивы затронутых ингредиентов,
+        старый индекс остается целым для запросов, которые его читают.
+        """
+        current = {}
+        for recipe_id, ingredient_id in RecipeIngredientAmount.objects.filter(
+                recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            current.setdefault(recipe_id, set()).add(ingredient_id)
+        postings = dict(self.postings)
+        recipes = dict(self.recipes)
+        copied = set()
+
+        def posting(ingredient_id):
+            if ingredient_id not in copied:
+                postings[ingredient_id] = array(
+                    'I', postings.get(ingredient_id, ()))
+                copied.add(ingredient_id)
+            return postings[ingredient_id]
+
+        for recipe_id in recipe_ids:
+            old = set(recipes.pop(recipe_id, ()))
+            new = current.get(recipe_id, set())
+            for ingredient_id in old - new:
+                ids = posting(ingredient_id)
+                del ids[bisect_left(ids, recipe_id)]
+            for ingredient_id in new - old:
+                ids = posting(ingredient_id)
+                ids.insert(bisect_left(ids, recipe_id), recipe_id)
+            if new:
+                recipes[recipe_id] = compact(new)
+        # Пустые массивы убираем в конце: ингредиент, ушедший из одного
+        # рецепта, мог появиться в другом из того же обновления
+        for ingredient_id in copied:
+            if not postings[ingredient_id]:
+                del postings[ingredient_id]
+        return CookIndex(postings, recipes)
+
+    def search(self, ingredient_ids, min_coverage=0, limit=None):
+        """Рецепты, где есть хотя бы один из ingredient_ids, по убыванию
+        доли покрытых ингредиентов.
+
+        Возвращает список (id рецепта, доля, найдено, всего ингредиентов).
+        """
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(self.postings.get(ingredient_id, ()))
+        # При равной доле выше рецепт, где совпало больше ингредиентов,
+        # затем более новый
+        found = [
+            (count / len(self.recipes[recipe_id]), count, recipe_id)
+            for recipe_id, count in matched.items()
+        ]
+        found = [item for item in found if item[0] >= min_coverage]
+        if limit is None:
+            found.sort(reverse=True)
+        else:
+            found = heapq.nlargest(limit, found)
+        return [
+            (recipe_id, coverage, count, len(self.recipes[recipe_id]))
+            for coverage, count, recipe_id in found
+        ]
+
+
+cook_index = IncrementalSnapshot('cook', CookIndex.load, CookIndex.updated)
@@ -0,0 +1,63 @@
+"""Счетчики избранного, рецептов и подписчиков, хранящиеся в колонках.
+
+Сигналы меняют их на единицу выражениями F(), массовые загрузки и команда
+recount пересчитывают заново.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from users.models import User
+
+from app.models import Favorite, Recipe, Subscription
+
+
+def change_counter(model, pk, field, delta):
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def count_of(model, field):
+    """Подзапрос: число строк model, ссылающихся полем field на объект"""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+def update_in_batches(queryset, batch_size, **values):
+    """UPDATE диапазонами первичного ключа, чтобы не держать долгих
+    блокировок на всей таблице"""
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    if batch_size is None:
+        return queryset.update(**values)
+    updated = 0
+    last = None
+    while True:
+        page = ids if last is None else ids.filter(pk__gt=last)
+        batch = list(page[:batch_size])
+        if not batch:
+            return updated
+        updated += queryset.filter(
+            pk__gte=batch[0], pk__lte=batch[-1]).update(**values)
+        last = batch[-1]
+
+
+def recount_recipes(ids=None, batch_size=None):
+    recipes = Recipe.objects.all()
+    if ids is not None:
+        recipes = recipes.filter(pk__in=ids)
+    return update_in_batches(
+        recipes, batch_size, favorites_count=count_of(Favorite, 'recipe'))
+
+
+def recount_users(ids=None, batch_size=None):
+    users = User.objects.all()
+    if ids is not None:
+        users = users.filter(pk__in=ids)
+    return update_in_batches(
+        users, batch_size,
+        recipes_count=count_of(Recipe, 'author'),
+        followers_count=count_of(Subscription, 'author'),
+    )
@@ -0,0 +1,113 @@
+"""Картинки рецептов: проверка, пережатие и миниатюры.
+
+В запросе загрузка только проверяется по заголовку, пережатие и миниатюры
+делаются в фоне (app.tasks.process_recipe_image). Миниатюры лежат по путям,
+вычисляемым из имени оригинала, поэтому ссылку на них можно отдать без
+обращения к хранилищу.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+THUMBNAILS_DIR = 'recipes/thumbs'
+IMAGE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def thumbnail_name(name, size):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{THUMBNAILS_DIR}/{stem}_{size}.webp'
+
+
+def thumbnail_url(name, size, storage=default_storage):
+    return storage.url(thumbnail_name(name, size))
+
+
+def placeholder_url():
+    return static(settings.RECIPE_IMAGE_PLACEHOLDER)
+
+
+def check_size(file):
+    if file.size > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Размер изображения больше '
+            f'{settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)} МБ')
+
+
+def read_header(file):
+    """Открывает картинку: Pillow читает только заголовок, пиксели
+    раскодируются позже и только при необходимости"""
+    try:
+        image = Image.open(file)
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        raise ValidationError('Загрузите корректное изображение')
+    if image.format not in IMAGE_FORMATS:
+        raise ValidationError('Поддерживаются форматы JPEG, PNG, GIF и WebP')
+    if image.width * image.height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f'Изображение слишком большое: {image.width}x{image.height}')
+    return image
+
+
+def inspect_image(file):
+    """Быстрая проверка загрузки в запросе, возвращает расширение файла"""
+    check_size(file)
+    image = read_header(file)
+    file.seek(0)
+    return IMAGE_FORMATS[image.format]
+
+
+def open_image(file, side):
+    """Открывает картинку, не раскодируя ее целиком сверх нужного размера"""
+    image = read_header(file)
+    # JPEG раскодируется сразу в уменьшенном масштабе
+    image.draft('RGB', (side, side))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def normalize_image(file):
+    """Проверяет размер загрузки и пережимает картинку в JPEG
+    с ограничением наибольшей стороны"""
+    check_size(file)
+    side = settings.RECIPE_IMAGE_MAX_SIDE
+    image = open_image(file, side)
+    image.thumbnail((side, side))
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=settings.RECIPE_IMAGE_QUALITY,
+               optimize=True, progressive=True)
+    stem = os.path.splitext(os.path.basename(file.name))[0]
+    return ContentFile(output.getvalue(), name=f'{stem}.jpg')
+
+
+def make_thumbnails(name, storage=default_storage):
+    """Рисует все миниатюры картинки, перезаписывая существующие"""
+    sizes = sorted(
+        settings.RECIPE_THUMBNAIL_SIZES.items(),
+        key=lambda item: item[1], reverse=True)
+    with storage.open(name) as f:
+        image = open_image(f, sizes[0][1])
+        image.load()
+    # От большей миниатюры к меньшей, каждая уменьшается из предыдущей
+    for size, side in sizes:
+        image.thumbnail((side, side))
+        output = BytesIO()
+        image.save(output, 'WEBP', quality=settings.RECIPE_THUMBNAIL_QUALITY)
+        target = thumbnail_name(name, size)
+        storage.delete(target)
+        storage.save(target, ContentFile(output.getvalue()))
+
+
+def delete_thumbnails(name, storage=default_storage):
+    for size in settings.RECIPE_THUMBNAIL_SIZES:
+        storage.delete(thumbnail_name(name, size))
@@ -0,0 +1,37 @@
+from bisect import bisect_left
+
+from app.models import Ingredient
+from app.snapshots import VersionedSnapshot
+
+
+class IngredientIndex:
+    """Отсортированный массив названий ингредиентов для поиска по префиксу"""
+
+    def __init__(self, rows):
+        entries = sorted(
+            (name.lower(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in rows
+        )
+        self.keys = [key for key, *_ in entries]
+        self.items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in entries
+        ]
+
+    @classmethod
+    def load(cls):
+        return cls(Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'))
+
+    def search(self, prefix, limit):
+        """Ингредиенты, название которых начинается с prefix.
+
+        Точное совпадение при сортировке оказывается первым.
+        """
+        prefix = prefix.strip().lower()
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\U0010ffff', lo=start)
+        return self.items[start:min(end, start + limit)]
+
+
+ingredient_index = VersionedSnapshot('ingredients', IngredientIndex.load)
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from users.models import User
+
+from api.views import RecipeViewSet
+from app.models import Favorite, Tag
+from app.seeding import seed
+
+FILTERS = (
+    ('лента', ''),
+    ('один тег', 'tags={tag}'),
+    ('три тега', 'tags={tag}&tags={tag2}&tags={tag3}'),
+    ('автор', 'author={author}'),
+    ('автор и тег', 'author={author}&tags={tag}'),
+    ('избранное', 'is_favorited=1'),
+    ('избранное и тег', 'is_favorited=1&tags={tag}'),
+    ('список покупок', 'is_in_shopping_cart=1'),
+    ('глубокая страница', 'page=50'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Выводит планы запросов ленты рецептов для всех сочетаний '
+            'фильтров RecipeFilter')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Сначала добавить столько синтетических рецептов')
+        parser.add_argument('--user', type=int, default=None,
+                            help='id пользователя, от имени которого запрос')
+        parser.add_argument('--no-analyze', action='store_true',
+                            help='EXPLAIN без выполнения запроса')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            seed(users=max(options['seed'] // 10, 2),
+                 recipes=options['seed'])
+        if options['user'] is not None:
+            user = User.objects.filter(pk=options['user']).first()
+            if user is None:
+                raise CommandError(
+                    f'Пользователь с id {options["user"]} не найден')
+        else:
+            user = User.objects.filter(
+                pk__in=Favorite.objects.values('user')).first()
+            if user is None:
+                raise CommandError(
+                    'Нет пользователей с избранным: укажите --user или '
+                    'добавьте данные через --seed')
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:3])
+        if not slugs:
+            raise CommandError('Нет тегов: добавьте данные через --seed')
+        slugs += slugs[-1:] * (3 - len(slugs))
+        author = user.recipes_author.values_list(
+            'author', flat=True).first() or user.pk
+        explain_options = {}
+        if connection.vendor == 'postgresql' and not options['no_analyze']:
+            explain_options = {'analyze': True, 'buffers': True}
+        factory = APIRequestFactory()
+        for title, query in FILTERS:
+            query = query.format(
+                tag=slugs[0], tag2=slugs[1], tag3=slugs[2], author=author)
+            queryset = self.feed_queryset(factory, user, query)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{title}: /api/recipes/?{query}'))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
+
+    def feed_queryset(self, factory, user, query):
+        """Запрос страницы ленты в том виде, в каком его строит view"""
+        django_request = factory.get(f'/api/recipes/?{query}')
+        force_authenticate(django_request, user=user)
+        view = RecipeViewSet(action='list', format_kwarg=None, kwargs={})
+        view.request = Request(django_request)
+        view.request.user = user
+        queryset = view.filter_queryset(view.get_queryset())
+        page = int(view.request.query_params.get('page', 1))
+        size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        return queryset[(page - 1) * size:page * size]
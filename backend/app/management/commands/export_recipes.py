@@ -0,0 +1,73 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import Recipe
+
+
+def recipe_record(recipe):
+    """Рецепт с тегами и ингредиентами без id базы: при загрузке они
+    сопоставляются по slug тега, названию ингредиента и имени автора"""
+    return {
+        'name': recipe.name,
+        'author': {
+            'username': recipe.author.username,
+            'email': recipe.author.email,
+            'first_name': recipe.author.first_name,
+            'last_name': recipe.author.last_name,
+        },
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'image': recipe.image.name or None,
+        'pub_date': recipe.pub_date.isoformat(),
+        'tags': [
+            {'name': tag.name, 'slug': tag.slug, 'color': tag.color}
+            for tag in recipe.tags.all()
+        ],
+        'ingredients': [
+            {
+                'name': row.ingredient.name,
+                'measurement_unit': row.ingredient.measurement_unit,
+                'amount': row.amount,
+            }
+            for row in recipe.recipe_ingredients.all()
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Выгружает рецепты в формате JSON Lines (один рецепт на строку)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', type=str, required=True,
+            help='Файл для выгрузки, "-" - стандартный вывод')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько рецептов читать из базы за один раз')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        started = time.perf_counter()
+        # iterator с chunk_size держит в памяти только одну пачку рецептов
+        # вместе с их тегами и ингредиентами
+        recipes = Recipe.objects.with_related().order_by('id').iterator(
+            chunk_size=options['batch_size'])
+        if options['path'] == '-':
+            count = self.write(recipes, self.stdout)
+        else:
+            with open(options['path'], 'wt', encoding='utf-8') as f:
+                count = self.write(recipes, f)
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {count}. {elapsed:.2f} с'))
+
+    def write(self, recipes, output):
+        count = 0
+        for recipe in recipes:
+            output.write(json.dumps(recipe_record(recipe), ensure_ascii=False))
+            output.write('\n')
+            count += 1
+        return count
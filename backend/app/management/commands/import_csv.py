@@ -1,21 +1,113 @@
 import csv
+import time
+from itertools import islice
 
+from app.ingredient_index import ingredient_index
 from app.models import Ingredient
-from django.core.management.base import BaseCommand
+from app.snapshots import response_generation
+from app.units import link_units
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+
+def read_rows(path):
+    with open(path, 'rt', encoding='utf-8') as f:
+        for row in csv.reader(f, delimiter=','):
+            if len(row) >= 2:
+                yield row[0].strip(), row[1].strip()
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
 
 
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты из csv-файла (название, единица измерения)'
 
     def add_arguments(self, parser):
-        parser.add_argument('--path', type=str)
+        parser.add_argument('--path', type=str, required=True)
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT')
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Обновлять единицу измерения у существующих ингредиентов')
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загрузка через COPY во временную таблицу (PostgreSQL)')
 
     def handle(self, *args, **options):
-        path = options['path']
-        with open(path, 'rt', encoding='utf-8') as f:
-            reader = csv.reader(f, delimiter=',')
-            for row in reader:
-                Ingredient.objects.create(
-                    name=row[0],
-                    measurement_unit=row[1]
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy доступен только для PostgreSQL')
+        started = time.perf_counter()
+        before = Ingredient.objects.count()
+        with transaction.atomic():
+            if options['copy']:
+                rows = self.copy(options['path'], options['update'])
+            else:
+                rows = self.bulk(
+                    options['path'], options['batch_size'], options['update'])
+            # Загрузка идет мимо save(), единицы проставляем сами
+            link_units()
+        ingredient_index.invalidate()
+        response_generation.invalidate()
+        created = Ingredient.objects.count() - before
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {rows}, добавлено ингредиентов: {created}, '
+            f'пропущено или обновлено: {rows - created}. '
+            f'{elapsed:.2f} с, {rows / max(elapsed, 1e-6):.0f} строк/с'
+        ))
+
+    def bulk(self, path, batch_size, update):
+        rows = 0
+        for batch in batches(read_rows(path), batch_size):
+            rows += len(batch)
+            # Повтор названия внутри одной пачки ломает ON CONFLICT UPDATE
+            unique = dict(batch)
+            objs = [
+                Ingredient(name=name, measurement_unit=unit)
+                for name, unit in unique.items()
+            ]
+            if update:
+                Ingredient.objects.bulk_create(
+                    objs,
+                    update_conflicts=True,
+                    unique_fields=('name',),
+                    update_fields=('measurement_unit',),
                 )
-                print(f'Ингридиент ({row[0]}, {row[1]}) добавлен.')
+            else:
+                Ingredient.objects.bulk_create(objs, ignore_conflicts=True)
+        return rows
+
+    def copy(self, path, update):
+        table = Ingredient._meta.db_table
+        on_conflict = (
+            'UPDATE SET measurement_unit = EXCLUDED.measurement_unit'
+            if update else 'NOTHING'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_staging '
+                '(name varchar(256), measurement_unit varchar(256)) '
+                'ON COMMIT DROP'
+            )
+            with open(path, 'rt', encoding='utf-8') as f:
+                cursor.copy_expert(
+                    'COPY ingredient_staging FROM STDIN WITH (FORMAT csv)', f)
+            cursor.execute('SELECT count(*) FROM ingredient_staging')
+            rows = cursor.fetchone()[0]
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT ON (trim(name)) trim(name), '
+                'trim(measurement_unit) FROM ingredient_staging '
+                f'ON CONFLICT (name) DO {on_conflict}'
+            )
+        return rows
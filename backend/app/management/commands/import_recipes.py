@@ -0,0 +1,229 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from users.models import User
+
+from app.cook_index import cook_index
+from app.counters import recount_users
+from app.ingredient_index import ingredient_index
+from app.management.commands.import_csv import batches
+from app.models import Ingredient, Recipe, RecipeIngredientAmount, Tag
+from app.popularity import reset_ranks
+from app.search import forget_search_index, update_search_vectors
+from app.snapshots import response_generation, tag_slugs
+from app.units import link_units
+
+
+def read_records(f):
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            raise CommandError(f'Строка {number}: {error}')
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из JSON Lines, выгруженных export_recipes. '
+            'Теги, ингредиенты и авторы сопоставляются по slug, названию '
+            'и имени пользователя, недостающие теги и ингредиенты создаются. '
+            'Уже загруженные рецепты пропускаются, после ошибки команду '
+            'можно запустить повторно')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', type=str, required=True,
+            help='Файл с рецептами, "-" - стандартный ввод')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько рецептов сохранять в одной транзакции')
+        parser.add_argument(
+            '--create-authors', action='store_true',
+            help='Создавать отсутствующих авторов без пароля, иначе их '
+                 'рецепты пропускаются')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        self.create_authors = options['create_authors']
+        self.tag_ids = {}
+        self.ingredient_ids = {}
+        self.author_ids = {}
+        started = time.perf_counter()
+        created = skipped = 0
+        try:
+            if options['path'] == '-':
+                created, skipped = self.load(
+                    sys.stdin, options['batch_size'])
+            else:
+                with open(options['path'], 'rt', encoding='utf-8') as f:
+                    created, skipped = self.load(f, options['batch_size'])
+        finally:
+            # bulk_create не отправляет сигналы, снимки сбрасываем сами
+            ingredient_index.invalidate()
+            tag_slugs.invalidate()
+            response_generation.invalidate()
+            forget_search_index()
+            cook_index.invalidate()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено рецептов: {created}, пропущено: {skipped}. '
+            f'{elapsed:.2f} с, {created / max(elapsed, 1e-6):.0f} рецептов/с'
+        ))
+
+    def load(self, f, batch_size):
+        created = skipped = 0
+        for batch in batches(read_records(f), batch_size):
+            try:
+                with transaction.atomic():
+                    saved = self.save_batch(batch)
+            except (KeyError, TypeError, ValueError) as error:
+                raise CommandError(
+                    f'Неверная запись после {created + skipped} рецептов: '
+                    f'{error!r}. Предыдущие пачки уже сохранены, при '
+                    f'повторном запуске они будут пропущены')
+            created += saved
+            skipped += len(batch) - saved
+        return created, skipped
+
+    def save_batch(self, records):
+        self.resolve_tags(records)
+        self.resolve_ingredients(records)
+        self.resolve_authors(records)
+        records = self.new_records([
+            record for record in records
+            if self.author_ids.get(record['author']['username'])
+        ])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(
+                name=record['name'],
+                author_id=self.author_ids[record['author']['username']],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=record.get('image') or None,
+            )
+            for record in records
+        ])
+        # auto_now_add перезаписывает дату при вставке, возвращаем исходную
+        dated = []
+        for recipe, record in zip(recipes, records):
+            pub_date = record.get('pub_date')
+            if pub_date:
+                recipe.pub_date = parse_datetime(pub_date)
+                dated.append(recipe)
+        if dated:
+            Recipe.objects.bulk_update(dated, ('pub_date',))
+        through = Recipe.tags.through
+        through.objects.bulk_create([
+            through(recipe=recipe, tag_id=self.tag_ids[tag['slug']])
+            for recipe, record in zip(recipes, records)
+            for tag in record['tags']
+        ], ignore_conflicts=True)
+        RecipeIngredientAmount.objects.bulk_create([
+            RecipeIngredientAmount(
+                recipe=recipe,
+                ingredient_id=self.ingredient_ids[ingredient['name']],
+                amount=ingredient['amount'],
+            )
+            for recipe, record in zip(recipes, records)
+            for ingredient in record['ingredients']
+        ])
+        recount_users({recipe.author_id for recipe in recipes})
+        reset_ranks([recipe.id for recipe in recipes])
+        update_search_vectors(
+            Recipe.objects.filter(pk__in=[recipe.id for recipe in recipes]))
+        return len(recipes)
+
+    def new_records(self, records):
+        """Записи без уже загруженных рецептов.
+
+        Рецепт считается загруженным, если у автора есть рецепт с тем же
+        названием и датой публикации (без даты - с тем же названием).
+        """
+        if not records:
+            return records
+        existing = set(Recipe.objects.filter(
+            author_id__in={
+                self.author_ids[record['author']['username']]
+                for record in records
+            },
+            name__in={record['name'] for record in records},
+        ).values_list('author_id', 'name', 'pub_date'))
+        names = {(author_id, name) for author_id, name, _ in existing}
+        new = []
+        for record in records:
+            author_id = self.author_ids[record['author']['username']]
+            pub_date = record.get('pub_date')
+            if pub_date:
+                key = (author_id, record['name'], parse_datetime(pub_date))
+                if key in existing:
+                    continue
+            elif (author_id, record['name']) in names:
+                continue
+            new.append(record)
+        return new
+
+    def resolve_tags(self, records):
+        missing = {
+            tag['slug']: tag
+            for record in records for tag in record['tags']
+            if tag['slug'] not in self.tag_ids
+        }
+        if not missing:
+            return
+        Tag.objects.bulk_create(
+            [Tag(name=tag['name'], slug=tag['slug'], color=tag['color'])
+             for tag in missing.values()],
+            ignore_conflicts=True,
+        )
+        self.tag_ids.update(
+            Tag.objects.filter(slug__in=missing).values_list('slug', 'id'))
+
+    def resolve_ingredients(self, records):
+        missing = {
+            ingredient['name']: ingredient['measurement_unit']
+            for record in records for ingredient in record['ingredients']
+            if ingredient['name'] not in self.ingredient_ids
+        }
+        if not missing:
+            return
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in missing.items()],
+            ignore_conflicts=True,
+        )
+        link_units(Ingredient.objects.filter(name__in=missing))
+        self.ingredient_ids.update(
+            Ingredient.objects.filter(
+                name__in=missing).values_list('name', 'id'))
+
+    def resolve_authors(self, records):
+        missing = {
+            record['author']['username']: record['author']
+            for record in records
+            if record['author']['username'] not in self.author_ids
+        }
+        if not missing:
+            return
+        if self.create_authors:
+            User.objects.bulk_create(
+                [User(
+                    username=author['username'],
+                    email=author['email'],
+                    first_name=author.get('first_name', ''),
+                    last_name=author.get('last_name', ''),
+                    password='!',
+                ) for author in missing.values()],
+                ignore_conflicts=True,
+            )
+        found = dict(User.objects.filter(
+            username__in=missing).values_list('username', 'id'))
+        # Отсутствующие запоминаются как None, чтобы не искать их снова
+        self.author_ids.update(
+            {username: found.get(username) for username in missing})
@@ -0,0 +1,37 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+
+from app.images import make_thumbnails
+from app.models import Recipe
+from app.tasks import process_recipe_image
+
+
+class Command(BaseCommand):
+    help = ('Пережимает картинки рецептов и создает миниатюры для тех, '
+            'что еще не обработаны')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перерисовать миниатюры и у обработанных картинок')
+
+    def handle(self, *args, **options):
+        processed = redrawn = failed = 0
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).values_list('id', 'image', 'image_processed')
+        if not options['force']:
+            recipes = recipes.filter(image_processed=False)
+        for recipe_id, name, image_processed in recipes.iterator():
+            try:
+                if image_processed:
+                    make_thumbnails(name)
+                    redrawn += 1
+                else:
+                    process_recipe_image(recipe_id)
+                    processed += 1
+            except (OSError, ValidationError) as error:
+                failed += 1
+                self.stderr.write(f'{recipe_id} {name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано: {processed}, перерисовано миниатюр: {redrawn}, '
+            f'ошибок: {failed}'))
@@ -0,0 +1,60 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import ShoppingExport
+from app.tasks import process_shopping_export
+
+
+class Command(BaseCommand):
+    help = ('Выполняет выгрузки списков покупок из очереди и удаляет '
+            'старые. С --poll работает как постоянный обработчик очереди')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll', type=float, default=None,
+            help='Не завершаться, проверять очередь раз в указанное '
+                 'количество секунд')
+        parser.add_argument(
+            '--stale-minutes', type=int, default=10,
+            help='Через сколько минут после начала выполняемая выгрузка '
+                 'считается прерванной')
+        parser.add_argument(
+            '--purge-days', type=int, default=None,
+            help='Удалить выгрузки старше указанного количества дней')
+
+    def handle(self, *args, **options):
+        if options['purge_days'] is not None:
+            self.purge(options['purge_days'])
+        while True:
+            done = self.process(options['stale_minutes'])
+            if options['poll'] is None:
+                self.stdout.write(f'Выполнено выгрузок: {done}')
+                return
+            if not done:
+                time.sleep(options['poll'])
+
+    def process(self, stale_minutes):
+        # Задачи, прерванные перезапуском, возвращаются в очередь.
+        # Время считается от начала выполнения, а не от постановки
+        ShoppingExport.objects.filter(
+            status=ShoppingExport.RUNNING,
+            started__lt=timezone.now() - timedelta(minutes=stale_minutes)
+        ).update(status=ShoppingExport.PENDING)
+        pending = list(ShoppingExport.objects.filter(
+            status=ShoppingExport.PENDING
+        ).order_by('created').values_list('id', flat=True))
+        return sum(process_shopping_export(job_id) for job_id in pending)
+
+    def purge(self, days):
+        old = ShoppingExport.objects.filter(
+            created__lt=timezone.now() - timedelta(days=days))
+        purged = 0
+        for job in old.iterator():
+            if job.file:
+                job.file.delete(save=False)
+            job.delete()
+            purged += 1
+        self.stdout.write(f'Удалено выгрузок: {purged}')
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.counters import recount_recipes, recount_users
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики избранного у рецептов, рецептов и '
+            'подписчиков у пользователей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк обновлять одним запросом')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        started = time.perf_counter()
+        recipes = recount_recipes(batch_size=options['batch_size'])
+        users = recount_users(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}. '
+            f'{elapsed:.2f} с'))
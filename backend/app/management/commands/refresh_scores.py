@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.popularity import refresh_trending, reset_ranks
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает ключи сортировки ленты по популярности. '
+            'Запускать по расписанию, например из cron раз в час')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько рецептов обрабатывать за раз')
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Заново посчитать очки за все время у всех рецептов')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        started = time.perf_counter()
+        if options['full']:
+            rebuilt = reset_ranks(batch_size=options['batch_size'])
+            self.stdout.write(f'Пересчитаны ключи рецептов: {rebuilt}')
+        seen, changed = refresh_trending(options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Тренд: просмотрено рецептов {seen}, изменено {changed}. '
+            f'{elapsed:.2f} с'))
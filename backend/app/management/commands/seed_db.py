@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from app.seeding import INGREDIENTS_CSV, seed
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--ingredients', type=int, default=None)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites', type=int, default=15)
+        parser.add_argument('--purchases', type=int, default=5)
+        parser.add_argument('--subscriptions', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--path', type=str, default=INGREDIENTS_CSV)
+
+    def handle(self, *args, **options):
+        created = seed(
+            users=options['users'],
+            recipes=options['recipes'],
+            ingredients=options['ingredients'],
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+            favorites=options['favorites'],
+            purchases=options['purchases'],
+            subscriptions=options['subscriptions'],
+            random_seed=options['seed'],
+            csv_path=options['path'],
+        )
+        for name, count in created.items():
+            self.stdout.write(f'{name}: {count}')
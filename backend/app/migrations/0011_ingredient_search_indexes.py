@@ -0,0 +1,37 @@
+# Generated by Django 4.1 on 2026-10-18 13:05
+
+from django.db import migrations
+
+CREATE_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS app_ingredient_name_lower_prefix '
+    'ON app_ingredient (lower(name) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS app_ingredient_name_trgm '
+    'ON app_ingredient USING gin (name gin_trgm_ops)',
+)
+
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS app_ingredient_name_trgm',
+    'DROP INDEX IF EXISTS app_ingredient_name_lower_prefix',
+)
+
+
+def run_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_shoppingexport'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_postgresql(CREATE_INDEXES), run_postgresql(DROP_INDEXES)),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_recipe_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_processed',
+            field=models.BooleanField(default=False, help_text='Картинка пережата и миниатюры готовы', verbose_name='Картинка обработана'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.1 on 2026-10-18 12:53
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# app.popularity.RANK_SCALE
+RANK_SCALE = 10 ** 10
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+def fill_ranks(apps, schema_editor):
+    Recipe = apps.get_model('app', 'Recipe')
+    Favorite = apps.get_model('app', 'Favorite')
+    Shopping = apps.get_model('app', 'Shopping')
+    Recipe.objects.update(
+        popular_rank=(
+            count_of(Favorite, 'recipe') * settings.POPULAR_FAVORITE_POINTS
+            + count_of(Shopping, 'recipe') * settings.POPULAR_CART_POINTS
+        ) * RANK_SCALE + F('id'),
+        trending_rank=F('id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, null=True, verbose_name='Добавлено'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popular_rank',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Ключ сортировки по популярности'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_rank',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Ключ сортировки по тренду'),
+        ),
+        migrations.AddField(
+            model_name='shopping',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, null=True, verbose_name='Добавлено'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popular_rank'], name='recipe_popular_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_rank'], name='recipe_trending_rank_idx'),
+        ),
+        migrations.RunPython(fill_ranks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1 on 2026-10-18 13:01
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Unit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256, unique=True, verbose_name='Название')),
+                ('factor', models.PositiveIntegerField(default=1, help_text='Сколько базовых единиц в одной', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Множитель')),
+                ('base', models.ForeignKey(blank=True, help_text='Пусто, если единица сама базовая или не переводится', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='derived', to='app.unit', verbose_name='Базовая единица')),
+            ],
+            options={
+                'verbose_name': 'Единица измерения',
+                'verbose_name_plural': 'Единицы измерения',
+            },
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='unit',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ingredients', to='app.unit', verbose_name='Единица измерения'),
+        ),
+    ]
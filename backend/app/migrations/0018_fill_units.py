@@ -0,0 +1,44 @@
+# Generated by Django 4.1 on 2026-10-18 13:02
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+# Название единицы -> (базовая единица, множитель)
+STANDARD_UNITS = {
+    'г': (None, 1),
+    'мл': (None, 1),
+    'шт.': (None, 1),
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+    'стакан': ('мл', 200),
+    'ст. л.': ('мл', 15),
+    'ч. л.': ('мл', 5),
+}
+
+
+def fill_units(apps, schema_editor):
+    Unit = apps.get_model('app', 'Unit')
+    Ingredient = apps.get_model('app', 'Ingredient')
+    units = {}
+    for name, (base, factor) in STANDARD_UNITS.items():
+        units[name], _ = Unit.objects.update_or_create(
+            name=name,
+            defaults={'base': units.get(base), 'factor': factor})
+    names = set(Ingredient.objects.values_list(
+        'measurement_unit', flat=True).distinct())
+    Unit.objects.bulk_create(
+        [Unit(name=name) for name in names - set(units)],
+        ignore_conflicts=True)
+    Ingredient.objects.update(unit=Subquery(Unit.objects.filter(
+        name=OuterRef('measurement_unit')).values('pk')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_unit'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_units, migrations.RunPython.noop),
+    ]
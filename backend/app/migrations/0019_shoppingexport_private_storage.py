@@ -0,0 +1,41 @@
+# Generated by Django 4.1 on 2026-10-18 13:08
+
+import os
+from uuid import uuid4
+
+import app.storages
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def move_exports(apps, schema_editor):
+    """Переносит готовые выгрузки из MEDIA_ROOT в закрытое хранилище"""
+    ShoppingExport = apps.get_model('app', 'ShoppingExport')
+    storage = app.storages.private_storage()
+    for job in ShoppingExport.objects.exclude(file='').exclude(
+            file__isnull=True).iterator():
+        name = job.file.name
+        if not default_storage.exists(name):
+            continue
+        extension = os.path.splitext(name)[1]
+        with default_storage.open(name, 'rb') as f:
+            job.file.name = storage.save(
+                f'exports/{uuid4().hex}{extension}', f)
+        job.save(update_fields=('file',))
+        default_storage.delete(name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_fill_units'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shoppingexport',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=app.storages.private_storage, upload_to='exports/', verbose_name='Файл'),
+        ),
+        migrations.RunPython(move_exports, migrations.RunPython.noop),
+    ]
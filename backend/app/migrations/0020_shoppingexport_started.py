@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_shoppingexport_private_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppingexport',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Начата'),
+        ),
+    ]
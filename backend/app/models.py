@@ -1,19 +1,10 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
-from users.models import User
+from django.db.models import Exists, OuterRef, Prefetch, Value
+from users.models import CounterFieldsMixin, User
 
-# class Unit(models.Model):
-"""Модель на будущее чтобы создавать единицы измерения"""
-#     title = models.CharField(
-#         max_length=200,
-#         default='г')
-
-#     class Meta:
-#         verbose_name = 'Единица измерения'
-#         verbose_name_plural = 'Единицы измерения'
-
-#     def __str__(self):
-#         return self.title
+from app.storages import private_storage
 
 
 class Tag(models.Model):
@@ -29,9 +20,45 @@ class Tag(models.Model):
         return self.name
 
 
+class Unit(models.Model):
+    """Единица измерения и ее перевод в базовую (г, мл, шт.)"""
+    name = models.CharField('Название', max_length=256, unique=True)
+    base = models.ForeignKey(
+        'self',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='derived',
+        verbose_name='Базовая единица',
+        help_text='Пусто, если единица сама базовая или не переводится'
+    )
+    factor = models.PositiveIntegerField(
+        'Множитель',
+        default=1,
+        validators=(MinValueValidator(1),),
+        help_text='Сколько базовых единиц в одной'
+    )
+
+    class Meta:
+        verbose_name = 'Единица измерения'
+        verbose_name_plural = 'Единицы измерения'
+
+    def __str__(self):
+        return self.name
+
+
 class Ingredient(models.Model):
     name = models.CharField(max_length=256, unique=True)
     measurement_unit = models.CharField(max_length=256, unique=False)
+    # Та же единица, что в measurement_unit, но с переводом в базовую
+    unit = models.ForeignKey(
+        Unit,
+        on_delete=models.PROTECT,
+        null=True,
+        editable=False,
+        related_name='ingredients',
+        verbose_name='Единица измерения'
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
@@ -40,8 +67,50 @@ class Ingredient(models.Model):
     def __str__(self):
         return self.name
 
-
-class Recipe(models.Model):
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'measurement_unit' in update_fields:
+            self.unit, _ = Unit.objects.get_or_create(
+                name=self.measurement_unit)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'unit'}
+        super().save(*args, **kwargs)
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов для ленты без запросов на каждый объект"""
+
+    def with_related(self):
+        # Поисковый вектор для вывода не нужен, а весит как весь текст
+        queryset = self.select_related('author').defer('search_vector')
+        return queryset.prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredientAmount.objects.select_related(
+                    'ingredient')
+            )
+        )
+
+    def with_user_flags(self, user):
+        """Флаги избранного, корзины и подписки одним запросом"""
+        if user is None or user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_is_subscribed=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Shopping.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     name = models.CharField(
         'Название рецепта',
         max_length=200,)
@@ -86,11 +155,49 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False
+    )
+    popular_rank = models.BigIntegerField(
+        'Ключ сортировки по популярности',
+        default=0,
+        editable=False
+    )
+    trending_rank = models.BigIntegerField(
+        'Ключ сортировки по тренду',
+        default=0,
+        editable=False
+    )
+    image_processed = models.BooleanField(
+        'Картинка обработана',
+        default=False,
+        help_text='Картинка пережата и миниатюры готовы'
+    )
+    # Заполняется только на PostgreSQL, см. app.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    # Меняются UPDATE с F() из сигналов и команд, см. CounterFieldsMixin
+    counter_fields = ('favorites_count', 'popular_rank', 'trending_rank')
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_id_idx'),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'),
+            models.Index(
+                fields=('-popular_rank',), name='recipe_popular_rank_idx'),
+            models.Index(
+                fields=('-trending_rank',), name='recipe_trending_rank_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -140,6 +247,12 @@ class Favorite(models.Model):
         verbose_name='Рецепт',
         on_delete=models.CASCADE
     )
+    created = models.DateTimeField(
+        'Добавлено',
+        auto_now_add=True,
+        null=True,
+        db_index=True
+    )
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
@@ -181,8 +294,7 @@ class Subscription(models.Model):
 
     @property
     def recipe_count(self):
-        recipes_count = Recipe.objects.filter(author=self.author).count
-        return recipes_count
+        return self.author.recipes_count
 
 
 class Shopping(models.Model):
@@ -198,6 +310,12 @@ class Shopping(models.Model):
         verbose_name='Покупки',
         on_delete=models.CASCADE
     )
+    created = models.DateTimeField(
+        'Добавлено',
+        auto_now_add=True,
+        null=True,
+        db_index=True
+    )
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
@@ -209,3 +327,42 @@ class Shopping(models.Model):
             models.UniqueConstraint(
                 fields=['user', 'recipe'], name='unique_shopping')
         ]
+
+
+class ShoppingExport(models.Model):
+    """Фоновая выгрузка списка покупок"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_exports',
+        verbose_name='Покупатель'
+    )
+    export_format = models.CharField('Формат', max_length=8)
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUSES, default=PENDING)
+    file = models.FileField(
+        'Файл', upload_to='exports/', storage=private_storage,
+        blank=True, null=True)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    started = models.DateTimeField('Начата', blank=True, null=True)
+    finished = models.DateTimeField('Завершена', blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.user} {self.export_format} {self.status}'
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Выгрузка списка покупок'
+        verbose_name_plural = 'Выгрузки списка покупок'
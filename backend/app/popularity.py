@@ -0,0 +1,101 @@
+"""Ключи сортировки ленты по популярности.
+
+Ключ рецепта равен очки * RANK_SCALE + id. Он уникален, поэтому ленту
+можно сортировать по одной индексированной колонке, и курсорная пагинация
+не спотыкается о рецепты с одинаковыми очками.
+
+popular - очки за все время, меняются сигналами при добавлении в избранное
+и в корзину. trending - очки с затуханием по времени, пересчитываются
+командой refresh_scores.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from app.counters import count_of, update_in_batches
+from app.models import Favorite, Recipe, Shopping
+
+RANK_SCALE = 10 ** 10
+
+
+def rank_points(rank):
+    return rank // RANK_SCALE
+
+
+def change_popularity(recipe_id, points, **counters):
+    """counters - счетчики рецепта, меняемые тем же UPDATE"""
+    Recipe.objects.filter(pk=recipe_id).update(
+        popular_rank=F('popular_rank') + points * RANK_SCALE,
+        **{field: Greatest(F(field) + delta, 0)
+           for field, delta in counters.items()})
+
+
+def reset_ranks(ids=None, batch_size=None):
+    """Ключи по текущему избранному и корзинам, без очков за тренд"""
+    recipes = Recipe.objects.all()
+    if ids is not None:
+        recipes = recipes.filter(pk__in=ids)
+    return update_in_batches(
+        recipes, batch_size,
+        popular_rank=(
+            count_of(Favorite, 'recipe') * settings.POPULAR_FAVORITE_POINTS
+            + count_of(Shopping, 'recipe') * settings.POPULAR_CART_POINTS
+        ) * RANK_SCALE + F('id'),
+        trending_rank=F('id'),
+    )
+
+
+def trending_points(recipe_ids, now):
+    """Очки за тренд: добавления за окно, каждое с весом, убывающим вдвое
+    за TRENDING_HALF_LIFE_DAYS. События собираются по дням"""
+    since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    today = timezone.localdate(now)
+    points = dict.fromkeys(recipe_ids, 0.0)
+    for model, weight in ((Favorite, settings.POPULAR_FAVORITE_POINTS),
+                          (Shopping, settings.POPULAR_CART_POINTS)):
+        days = model.objects.filter(
+            recipe_id__in=recipe_ids, created__gte=since
+        ).values('recipe_id', day=TruncDate('created')).annotate(
+            count=Count('id')
+        ).order_by()
+        for row in days:
+            age = (today - row['day']).days
+            points[row['recipe_id']] += weight * row['count'] * 0.5 ** (
+                age / settings.TRENDING_HALF_LIFE_DAYS)
+    return {
+        recipe_id: round(score * settings.TRENDING_PRECISION)
+        for recipe_id, score in points.items()
+    }
+
+
+def refresh_trending(batch_size=1000, now=None):
+    """Пересчитывает тренд у рецептов с событиями за окно и у тех,
+    у кого очки еще не обнулились. Остальные рецепты не трогаются.
+
+    Возвращает (просмотрено рецептов, изменено ключей).
+    """
+    now = now or timezone.now()
+    since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    candidates = set(Recipe.objects.filter(
+        trending_rank__gte=RANK_SCALE).values_list('id', flat=True))
+    for model in (Favorite, Shopping):
+        candidates.update(model.objects.filter(
+            created__gte=since).values_list('recipe_id', flat=True))
+    candidates = sorted(candidates)
+    changed = 0
+    for start in range(0, len(candidates), batch_size):
+        ranks = dict(Recipe.objects.filter(
+            id__in=candidates[start:start + batch_size]
+        ).values_list('id', 'trending_rank'))
+        updates = [
+            Recipe(id=recipe_id,
+                   trending_rank=points * RANK_SCALE + recipe_id)
+            for recipe_id, points in trending_points(list(ranks), now).items()
+            if points * RANK_SCALE + recipe_id != ranks[recipe_id]
+        ]
+        Recipe.objects.bulk_update(updates, ('trending_rank',))
+        changed += len(updates)
+    return len(candidates), changed
@@ -0,0 +1,155 @@
+"""Полнотекстовый поиск рецептов по названию, ингредиентам и описанию.
+
+На PostgreSQL вектор хранится в колонке Recipe.search_vector с GIN-индексом
+и обновляется сигналами после фиксации транзакции. Вес у названия A, у
+ингредиентов B, у описания C.
+
+На других базах (SQLite в тестах) поиск идет по индексу в памяти процесса:
+слова без окончаний, совпадение по началу слова, те же веса.
+"""
+import re
+from bisect import bisect_left
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import (Case, F, FloatField, OuterRef, Subquery, Value,
+                              When)
+
+from app.counters import update_in_batches
+from app.models import Recipe, RecipeIngredientAmount
+from app.snapshots import VersionedSnapshot
+
+# Веса частей рецепта, как у ts_rank по умолчанию для A, B и C
+WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+
+WORD = re.compile(r'\w+')
+
+
+def use_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+def search_vector():
+    config = settings.RECIPE_SEARCH_CONFIG
+    ingredients = Subquery(
+        RecipeIngredientAmount.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(ingredients, weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+def update_search_vectors(recipes=None, batch_size=None):
+    """Пересчитывает векторы рецептов из recipes (по умолчанию всех).
+
+    Нужен после массовых изменений, которые не отправляют сигналы.
+    Не на PostgreSQL ничего не делает.
+    """
+    if not use_postgresql():
+        return 0
+    if recipes is None:
+        recipes = Recipe.objects.all()
+    return update_in_batches(
+        recipes, batch_size, search_vector=search_vector())
+
+
+def stem(word):
+    """Грубая основа слова: без последних букв окончания"""
+    word = word.lower().replace('ё', 'е')
+    if len(word) > 5:
+        return word[:len(word) - 2]
+    return word
+
+
+def words(text):
+    return [stem(word) for word in WORD.findall(text or '')]
+
+
+class RecipeSearchIndex:
+    """Отсортированные основы слов рецептов для поиска без PostgreSQL"""
+
+    def __init__(self, recipes, ingredients):
+        weights = {}
+        parts = [
+            (pk, part, text)
+            for pk, name, text in recipes
+            for part, text in (('name', name), ('text', text))
+        ]
+        parts += [(pk, 'ingredients', name) for pk, name in ingredients]
+        for pk, part, text in parts:
+            for word in words(text):
+                matches = weights.setdefault(word, {})
+                matches[pk] = max(matches.get(pk, 0), WEIGHTS[part])
+        self.keys = sorted(weights)
+        self.matches = [weights[key] for key in self.keys]
+
+    @classmethod
+    def load(cls):
+        return cls(
+            Recipe.objects.values_list('id', 'name', 'text'),
+            RecipeIngredientAmount.objects.values_list(
+                'recipe_id', 'ingredient__name'),
+        )
+
+    def search(self, query, limit):
+        """id рецептов, где есть все слова запроса, и их вес.
+
+        Слово запроса совпадает со словами рецепта, начинающимися с его
+        основы.
+        """
+        scores = None
+        for word in set(words(query)):
+            found = {}
+            start = bisect_left(self.keys, word)
+            end = bisect_left(self.keys, word + '\U0010ffff', lo=start)
+            for matches in self.matches[start:end]:
+                for pk, weight in matches.items():
+                    found[pk] = max(found.get(pk, 0), weight)
+            if scores is None:
+                scores = found
+            else:
+                scores = {
+                    pk: score + found[pk]
+                    for pk, score in scores.items() if pk in found
+                }
+        best = sorted(
+            (scores or {}).items(), key=lambda item: (-item[1], -item[0]))
+        return best[:limit]
+
+
+recipe_search_index = VersionedSnapshot(
+    'recipe_search', RecipeSearchIndex.load)
+
+
+def forget_search_index():
+    if not use_postgresql():
+        recipe_search_index.invalidate()
+
+
+def search_recipes(queryset, query):
+    """Рецепты queryset, подходящие под запрос, с релевантностью в rank"""
+    if use_postgresql():
+        query = SearchQuery(
+            query, config=settings.RECIPE_SEARCH_CONFIG,
+            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query))
+    found = recipe_search_index.get().search(
+        query, settings.RECIPE_SEARCH_FALLBACK_LIMIT)
+    if not found:
+        return queryset.annotate(rank=Value(0.0)).none()
+    return queryset.filter(pk__in=[pk for pk, _ in found]).annotate(
+        rank=Case(
+            *[When(pk=pk, then=Value(score)) for pk, score in found],
+            output_field=FloatField(),
+        )
+    )
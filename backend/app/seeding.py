@@ -0,0 +1,138 @@
+"""Синтетический набор данных для нагрузочных тестов и анализа запросов"""
+import csv
+import os
+import random
+
+from django.conf import settings
+from django.db import transaction
+from users.models import User
+
+from app.cook_index import cook_index
+from app.counters import recount_recipes, recount_users
+from app.ingredient_index import ingredient_index
+from app.models import (Favorite, Ingredient, Recipe, RecipeIngredientAmount,
+                        Shopping, Subscription, Tag)
+from app.popularity import reset_ranks
+from app.search import forget_search_index, update_search_vectors
+from app.snapshots import response_generation
+from app.units import link_units
+
+INGREDIENTS_CSV = os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+
+TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+    ('Десерт', 'dessert', '#F4A300'),
+    ('Выпечка', 'bakery', '#B5651D'),
+    ('Напитки', 'drinks', '#1E90FF'),
+)
+
+
+def read_ingredients(path=INGREDIENTS_CSV, limit=None):
+    with open(path, 'rt', encoding='utf-8') as f:
+        for number, row in enumerate(csv.reader(f, delimiter=',')):
+            if limit is not None and number >= limit:
+                break
+            yield row[0], row[1]
+
+
+@transaction.atomic
+def seed(users=20, recipes=200, ingredients=None, ingredients_per_recipe=8,
+         favorites=15, purchases=5, subscriptions=8, random_seed=0,
+         csv_path=INGREDIENTS_CSV):
+    """Заполняет базу данными заданного размера.
+
+    Возвращает словарь с количеством созданных объектов.
+    """
+    rnd = random.Random(random_seed)
+
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=name, measurement_unit=unit)
+         for name, unit in read_ingredients(csv_path, ingredients)],
+        ignore_conflicts=True,
+    )
+    link_units()
+    transaction.on_commit(ingredient_index.invalidate)
+    transaction.on_commit(response_generation.invalidate)
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+
+    Tag.objects.bulk_create(
+        [Tag(name=name, slug=slug, color=color)
+         for name, slug, color in TAGS],
+        ignore_conflicts=True,
+    )
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+
+    offset = User.objects.count()
+    user_objs = User.objects.bulk_create([
+        User(
+            username=f'bench_user_{offset + number}',
+            email=f'bench_user_{offset + number}@example.com',
+            first_name='Bench',
+            last_name=f'User {offset + number}',
+            password='!',
+        )
+        for number in range(users)
+    ])
+
+    recipe_objs = Recipe.objects.bulk_create([
+        Recipe(
+            name=f'Рецепт {number}',
+            author=rnd.choice(user_objs),
+            text=f'Описание рецепта {number}. ' * 5,
+            cooking_time=rnd.randint(5, 180),
+            image='recipes/placeholder.png',
+        )
+        for number in range(recipes)
+    ])
+
+    amounts = []
+    recipe_tags = []
+    through = Recipe.tags.through
+    per_recipe = min(ingredients_per_recipe, len(ingredient_ids))
+    for recipe in recipe_objs:
+        for ingredient_id in rnd.sample(ingredient_ids, per_recipe):
+            amounts.append(RecipeIngredientAmount(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=rnd.randint(1, 500),
+            ))
+        for tag_id in rnd.sample(tag_ids, rnd.randint(1, 3)):
+            recipe_tags.append(through(recipe=recipe, tag_id=tag_id))
+    RecipeIngredientAmount.objects.bulk_create(amounts, batch_size=1000)
+    through.objects.bulk_create(recipe_tags, batch_size=1000)
+
+    favorite_objs = []
+    purchase_objs = []
+    subscription_objs = []
+    for user in user_objs:
+        for recipe in rnd.sample(recipe_objs, min(favorites, recipes)):
+            favorite_objs.append(Favorite(user=user, recipe=recipe))
+        for recipe in rnd.sample(recipe_objs, min(purchases, recipes)):
+            purchase_objs.append(Shopping(user=user, recipe=recipe))
+        authors = [author for author in user_objs if author != user]
+        for author in rnd.sample(authors, min(subscriptions, len(authors))):
+            subscription_objs.append(Subscription(user=user, author=author))
+    Favorite.objects.bulk_create(favorite_objs, batch_size=1000)
+    Shopping.objects.bulk_create(purchase_objs, batch_size=1000)
+    Subscription.objects.bulk_create(subscription_objs, batch_size=1000)
+    # bulk_create не отправляет сигналы, счетчики считаем заново
+    recount_recipes([recipe.id for recipe in recipe_objs])
+    reset_ranks([recipe.id for recipe in recipe_objs])
+    update_search_vectors(
+        Recipe.objects.filter(pk__in=[recipe.id for recipe in recipe_objs]))
+    transaction.on_commit(forget_search_index)
+    transaction.on_commit(cook_index.invalidate)
+    recount_users([user.id for user in user_objs])
+
+    return {
+        'users': len(user_objs),
+        'recipes': len(recipe_objs),
+        'ingredients': len(ingredient_ids),
+        'tags': len(tag_ids),
+        'amounts': len(amounts),
+        'favorites': len(favorite_objs),
+        'purchases': len(purchase_objs),
+        'subscriptions': len(subscription_objs),
+    }
@@ -1,42 +1,240 @@
-from django.http import HttpResponse
+import csv
+import hashlib
+import json
+import os
+from io import BytesIO, StringIO
+from itertools import chain
+from tempfile import SpooledTemporaryFile
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.http import FileResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
-from app.models import RecipeIngredientAmount
+from app.models import RecipeIngredientAmount, Shopping
+from app.units import base_amount, base_unit_name
 
+FONT_NAME = 'Handicraft'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'data', 'Handicraft Regular.ttf')
 
-def download_shopping(self, request):
-    final_list = {}
-    ingredients = RecipeIngredientAmount.objects.filter(
-            recipe__purchases__user=request.user).values_list(
-            'ingredient__name',
-            'ingredient__measurement_unit',
-            'amount'
+SHOPPING_DIGEST_KEY = 'shopping:digest:{}'
+SHOPPING_FILE_KEY = 'shopping:file:{}:{}'
+SHOPPING_RECIPE_KEY = 'shopping:recipe:{}'
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN_LEFT = 75
+MARGIN_RIGHT = 50
+MARGIN_TOP = 50
+MARGIN_BOTTOM = 50
+TITLE_SIZE = 24
+LINE_SIZE = 16
+LINE_HEIGHT = 25
+
+
+def register_fonts():
+    """Регистрирует шрифт для PDF один раз на процесс"""
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def get_shopping_list(user):
+    """Список покупок, просуммированный по ингредиентам в базе.
+
+    Количества переводятся в базовые единицы (кг в г, ложки в мл) и
+    суммируются тем же запросом. Возвращает список кортежей (название,
+    единица измерения, количество), отсортированный по названию.
+    """
+    return list(
+        RecipeIngredientAmount.objects.filter(
+            recipe__purchases__user=user
+        ).annotate(
+            unit_name=base_unit_name('ingredient__')
+        ).values(
+            'ingredient__name', 'unit_name'
+        ).annotate(
+            total=Sum(base_amount())
+        ).order_by(
+            'ingredient__name'
+        ).values_list(
+            'ingredient__name', 'unit_name', 'total'
         )
-    for item in ingredients:
-        name = item[0]
-        if name not in final_list:
-            final_list[name] = {
-                    'measurement_unit': item[1],
-                    'amount': item[2]
-                }
-        else:
-            final_list[name]['amount'] += item[2]
-    pdfmetrics.registerFont(
-            TTFont('Handicraft', 'data/Handicraft Regular.ttf', 'UTF-8'))
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = ('attachment; '
-                                       'filename="Recipes.pdf"')
-    page = canvas.Canvas(response)
-    page.setFont('Handicraft', size=24)
-    page.drawString(200, 800, 'Список покупок')
-    page.setFont('Handicraft', size=16)
-    height = 750
-    for i, (name, data) in enumerate(final_list.items(), 1):
-        page.drawString(75, height, (f'{i}. {name} - {data["amount"]} '
-                                     f'{data["measurement_unit"]}'))
-        height -= 25
+    )
+
+
+def shopping_list_digest(shopping_list):
+    content = json.dumps(shopping_list, ensure_ascii=False)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def forget_shopping_lists(user_ids):
+    """Сбрасывает закешированные отпечатки списков покупок"""
+    cache.delete_many(
+        [SHOPPING_DIGEST_KEY.format(user_id) for user_id in set(user_ids)])
+
+
+def forget_recipe_shopping_lists(recipe_ids):
+    """Меняет версии рецептов: отпечатки с ними становятся недействительны"""
+    cache.set_many(
+        {SHOPPING_RECIPE_KEY.format(recipe_id): uuid4().hex
+         for recipe_id in set(recipe_ids)},
+        settings.SHOPPING_LIST_CACHE_TIMEOUT
+    )
+
+
+def get_recipe_versions(recipe_ids):
+    keys = [SHOPPING_RECIPE_KEY.format(recipe_id) for recipe_id in recipe_ids]
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+        versions.update(missing)
+    return versions
+
+
+def render_shopping_pdf(shopping_list, output):
+    """Рисует список покупок в output, перенося строки и страницы"""
+    register_fonts()
+    # reportlab 3.5 читает имя файла, а у SpooledTemporaryFile в памяти его
+    # нет. Документ reportlab все равно собирает в памяти целиком
+    buffer = BytesIO()
+    page = canvas.Canvas(buffer, pagesize=A4)
+    width = PAGE_WIDTH - MARGIN_LEFT - MARGIN_RIGHT
+    page.setFont(FONT_NAME, size=TITLE_SIZE)
+    page.drawString(200, PAGE_HEIGHT - MARGIN_TOP - 0.5 * LINE_HEIGHT,
+                    'Список покупок')
+    page.setFont(FONT_NAME, size=LINE_SIZE)
+    height = PAGE_HEIGHT - MARGIN_TOP - 2.5 * LINE_HEIGHT
+    for i, (name, measurement_unit, amount) in enumerate(shopping_list, 1):
+        text = f'{i}. {name} - {amount} {measurement_unit}'
+        for line in simpleSplit(text, FONT_NAME, LINE_SIZE, width):
+            if height < MARGIN_BOTTOM:
+                page.showPage()
+                page.setFont(FONT_NAME, size=LINE_SIZE)
+                height = PAGE_HEIGHT - MARGIN_TOP - LINE_HEIGHT
+            page.drawString(MARGIN_LEFT, height, line)
+            height -= LINE_HEIGHT
     page.showPage()
     page.save()
+    output.write(buffer.getbuffer())
+
+
+def render_shopping_txt(shopping_list, output):
+    # Пишем байты построчно: до Python 3.11 SpooledTemporaryFile нельзя
+    # обернуть в TextIOWrapper
+    output.write('Список покупок\n\n'.encode())
+    for i, (name, measurement_unit, amount) in enumerate(shopping_list, 1):
+        output.write(f'{i}. {name} - {amount} {measurement_unit}\n'.encode())
+
+
+def render_shopping_csv(shopping_list, output):
+    line = StringIO()
+    writer = csv.writer(line)
+    for row in chain([('name', 'measurement_unit', 'amount')],
+                     shopping_list):
+        writer.writerow(row)
+        output.write(line.getvalue().encode())
+        line.seek(0)
+        line.truncate()
+
+
+def render_shopping_json(shopping_list, output):
+    encoder = json.JSONEncoder(ensure_ascii=False)
+    for chunk in encoder.iterencode([
+        {'name': name, 'measurement_unit': measurement_unit,
+         'amount': amount}
+        for name, measurement_unit, amount in shopping_list
+    ]):
+        output.write(chunk.encode())
+
+
+SHOPPING_FORMATS = {
+    'pdf': (render_shopping_pdf, 'application/pdf'),
+    'txt': (render_shopping_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_shopping_csv, 'text/csv; charset=utf-8'),
+    'json': (render_shopping_json, 'application/json'),
+}
+
+
+def get_shopping_digest(user):
+    """Отпечаток списка покупок и время его последнего изменения.
+
+    Отпечаток пользователя хранится вместе с версиями рецептов корзины,
+    изменение любого из них делает отпечаток недействительным. Пока он
+    действителен, база не запрашивается и третьим элементом
+    возвращается None, иначе - свежий список покупок.
+    """
+    digest_key = SHOPPING_DIGEST_KEY.format(user.id)
+    cached = cache.get(digest_key)
+    if cached is not None:
+        digest, versions, modified = cached
+        if cache.get_many(list(versions)) == versions:
+            return digest, modified, None
+    versions = get_recipe_versions(
+        Shopping.objects.filter(user=user).values_list('recipe_id', flat=True))
+    shopping_list = get_shopping_list(user)
+    digest = shopping_list_digest(shopping_list)
+    if cached is not None and cached[0] == digest:
+        modified = cached[2]
+    else:
+        modified = timezone.now().replace(microsecond=0)
+    cache.set(
+        digest_key, (digest, versions, modified),
+        settings.SHOPPING_LIST_CACHE_TIMEOUT
+    )
+    return digest, modified, shopping_list
+
+
+def get_shopping_file(user, export_format, digest, shopping_list=None):
+    """Файл со списком покупок из кеша по отпечатку содержимого.
+
+    Повторное скачивание неизменного списка не перерисовывает документ.
+    """
+    file_key = SHOPPING_FILE_KEY.format(export_format, digest)
+    content = cache.get(file_key)
+    if content is not None:
+        return BytesIO(content)
+    if shopping_list is None:
+        shopping_list = get_shopping_list(user)
+        file_key = SHOPPING_FILE_KEY.format(
+            export_format, shopping_list_digest(shopping_list))
+    render, _ = SHOPPING_FORMATS[export_format]
+    # Большие документы уходят из памяти во временный файл на диске
+    output = SpooledTemporaryFile(max_size=settings.SHOPPING_FILE_SPOOL_SIZE)
+    render(shopping_list, output)
+    size = output.tell()
+    output.seek(0)
+    if size <= settings.SHOPPING_FILE_CACHE_MAX_SIZE:
+        cache.set(
+            file_key, output.read(), settings.SHOPPING_LIST_CACHE_TIMEOUT)
+        output.seek(0)
+    return output
+
+
+def download_shopping(self, request):
+    export_format = request.accepted_renderer.format
+    digest, modified, shopping_list = get_shopping_digest(request.user)
+    etag = f'"{digest[:32]}-{export_format}"'
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(modified.timestamp()))
+    if response is None:
+        _, content_type = SHOPPING_FORMATS[export_format]
+        response = FileResponse(
+            get_shopping_file(
+                request.user, export_format, digest, shopping_list),
+            as_attachment=True,
+            filename=f'Recipes.{export_format}',
+            content_type=content_type,
+        )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified.timestamp())
+    patch_vary_headers(response, ('Accept',))
     return response
@@ -0,0 +1,173 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from users.models import User
+
+from app.cook_index import cook_index
+from app.counters import change_counter
+from app.ingredient_index import ingredient_index
+from app.models import (Favorite, Ingredient, Recipe, RecipeIngredientAmount,
+                        Shopping, Subscription, Tag, Unit)
+from app.popularity import change_popularity
+from app.search import forget_search_index, update_search_vectors
+from app.servises import forget_recipe_shopping_lists, forget_shopping_lists
+from app.snapshots import response_generation, tag_slugs
+from app.user_state import forget_user_state
+
+
+@receiver((post_save, post_delete), sender=Shopping)
+def shopping_changed(sender, instance, **kwargs):
+    # После фиксации: иначе параллельный запрос прочитает старую корзину
+    # и закеширует ее отпечаток на SHOPPING_LIST_CACHE_TIMEOUT
+    user_id = instance.user_id
+    transaction.on_commit(lambda: forget_shopping_lists([user_id]))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=Shopping)
+@receiver((post_save, post_delete), sender=Subscription)
+def user_state_changed(sender, instance, **kwargs):
+    # После фиксации: иначе параллельный запрос успеет закешировать
+    # состояние до изменения
+    user_id = instance.user_id
+    transaction.on_commit(lambda: forget_user_state(user_id))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredientAmount)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    recipe_id = instance.recipe_id
+    transaction.on_commit(lambda: forget_recipe_shopping_lists([recipe_id]))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    if created:
+        return
+    recipe_ids = list(RecipeIngredientAmount.objects.filter(
+        ingredient=instance).values_list('recipe_id', flat=True))
+    transaction.on_commit(lambda: forget_recipe_shopping_lists(recipe_ids))
+
+
+@receiver(post_save, sender=Unit)
+def unit_changed(sender, instance, created, **kwargs):
+    if created:
+        return
+    # Изменился перевод: пересчитать списки покупок с этой единицей
+    # и с единицами, которые в нее переводятся
+    recipe_ids = list(RecipeIngredientAmount.objects.filter(
+        Q(ingredient__unit=instance) | Q(ingredient__unit__base=instance)
+    ).values_list('recipe_id', flat=True))
+    transaction.on_commit(lambda: forget_recipe_shopping_lists(recipe_ids))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_catalog_changed(sender, **kwargs):
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(sender, **kwargs):
+    transaction.on_commit(tag_slugs.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredientAmount)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def public_data_changed(sender, **kwargs):
+    transaction.on_commit(response_generation.invalidate)
+
+
+@receiver((post_save, post_delete), sender=User)
+def author_changed(sender, update_fields=None, **kwargs):
+    # Вход пользователя обновляет только last_login
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    transaction.on_commit(response_generation.invalidate)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        change_popularity(
+            instance.recipe_id, settings.POPULAR_FAVORITE_POINTS,
+            favorites_count=1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_removed(sender, instance, **kwargs):
+    change_popularity(
+        instance.recipe_id, -settings.POPULAR_FAVORITE_POINTS,
+        favorites_count=-1)
+
+
+@receiver(post_save, sender=Shopping)
+def cart_added(sender, instance, created, **kwargs):
+    if created:
+        change_popularity(instance.recipe_id, settings.POPULAR_CART_POINTS)
+
+
+@receiver(post_delete, sender=Shopping)
+def cart_removed(sender, instance, **kwargs):
+    change_popularity(instance.recipe_id, -settings.POPULAR_CART_POINTS)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+        # Ключи сортировки без очков, но уникальные: равны id
+        Recipe.objects.filter(pk=instance.pk).update(
+            popular_rank=F('id'), trending_rank=F('id'))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_removed(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_text_changed(sender, instance, update_fields=None, **kwargs):
+    # Ингредиенты сохраняются после рецепта в той же транзакции, поэтому
+    # вектор считается после фиксации
+    if update_fields is not None and not {'name', 'text'} & set(update_fields):
+        return
+    recipes = Recipe.objects.filter(pk=instance.pk)
+    transaction.on_commit(lambda: update_search_vectors(recipes))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, **kwargs):
+    if created:
+        return
+    recipes = Recipe.objects.filter(
+        pk__in=RecipeIngredientAmount.objects.filter(
+            ingredient=instance).values('recipe_id'))
+    transaction.on_commit(lambda: update_search_vectors(recipes))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredientAmount)
+@receiver((post_save, post_delete), sender=Ingredient)
+def search_data_changed(sender, **kwargs):
+    transaction.on_commit(forget_search_index)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredientAmount)
+def recipe_composition_changed(sender, instance, **kwargs):
+    recipe_id = instance.recipe_id
+    transaction.on_commit(lambda: cook_index.changed([recipe_id]))
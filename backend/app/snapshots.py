@@ -0,0 +1,137 @@
+import random
+import threading
+from uuid import uuid4
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import BaseCache
+
+
+class VersionedSnapshot:
+    """Данные, загруженные в память процесса и сверяемые с общей версией.
+
+    Версия хранится в общем кеше. invalidate() меняет её, и каждый
+    процесс при следующем обращении перезагружает свою копию данных.
+    """
+
+    def __init__(self, name, loader):
+        self.key = f'snapshot:{name}:version'
+        self.loader = loader
+        self.version = None
+        self.data = None
+        self.lock = threading.Lock()
+
+    def current_version(self):
+        version = cache.get(self.key)
+        if version is None:
+            cache.add(self.key, uuid4().hex, None)
+            version = cache.get(self.key)
+        return version
+
+    def get(self):
+        version = self.current_version()
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.data = self.loader()
+                    self.version = version
+        return self.data
+
+    def invalidate(self):
+        cache.set(self.key, uuid4().hex, None)
+
+
+def atomic_incr():
+    """incr кеша атомарен: в BaseCache это get и set, так работают file
+    и кеш в базе, а Redis, memcached и locmem переопределяют его"""
+    return type(caches['default']).incr is not BaseCache.incr
+
+
+class IncrementalSnapshot:
+    """Данные в памяти процесса, обновляемые по журналу изменений.
+
+    Счетчик версий и журнал измененных ключей хранятся в общем кеше.
+    changed() добавляет запись в журнал, и процесс, отставший не больше
+    чем на max_changes версий, передает своей копии только измененные
+    ключи: updater(data, keys) возвращает обновленную копию. Если журнал
+    неполон или отставание больше, данные загружаются заново.
+
+    Журнал ведется только при атомарном incr: иначе два процесса получат
+    один номер версии и одна запись затрет другую. Без него каждое
+    изменение сбрасывает данные во всех процессах.
+    """
+
+    def __init__(self, name, loader, updater, max_changes=100,
+                 changes_timeout=24 * 60 * 60):
+        self.key = f'snapshot:{name}:version'
+        self.changes_prefix = f'snapshot:{name}:changes'
+        self.loader = loader
+        self.updater = updater
+        self.max_changes = max_changes
+        self.changes_timeout = changes_timeout
+        self.version = None
+        self.data = None
+        self.lock = threading.Lock()
+
+    def current_version(self):
+        version = cache.get(self.key)
+        if version is None:
+            # Случайное начало: если счетчик вытеснят из кеша, новые
+            # версии не совпадут с уже примененными
+            cache.add(self.key, random.getrandbits(48), None)
+            version = cache.get(self.key)
+        return version
+
+    def get(self):
+        version = self.current_version()
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.data = self.refresh(version)
+                    self.version = version
+        return self.data
+
+    def refresh(self, version):
+        if self.data is not None and (
+                0 < version - self.version <= self.max_changes):
+            keys = [
+                f'{self.changes_prefix}:{number}'
+                for number in range(self.version + 1, version + 1)
+            ]
+            changes = cache.get_many(keys)
+            if len(changes) == len(keys):
+                return self.updater(
+                    self.data, set().union(*changes.values()))
+        return self.loader()
+
+    def changed(self, keys):
+        """Записывает в журнал ключи, данные по которым изменились"""
+        if not atomic_incr():
+            self.invalidate()
+            return
+        try:
+            version = cache.incr(self.key)
+        except ValueError:
+            self.invalidate()
+            return
+        # add не перезаписывает чужую запись: если номер уже занят,
+        # журнал ненадежен и данные загружаются заново
+        if not cache.add(
+                f'{self.changes_prefix}:{version}', list(keys),
+                self.changes_timeout):
+            self.invalidate()
+
+    def invalidate(self):
+        """Все процессы загрузят данные заново"""
+        cache.set(self.key, random.getrandbits(48), None)
+
+
+def load_tag_slugs():
+    from app.models import Tag
+    return dict(Tag.objects.values_list('slug', 'id'))
+
+
+tag_slugs = VersionedSnapshot('tags', load_tag_slugs)
+
+
+# Для ответов API нужна только версия, сами данные не загружаются
+response_generation = VersionedSnapshot('responses', lambda: None)
@@ -0,0 +1,9 @@
+"""Хранилища файлов, которые нельзя отдавать по прямой ссылке"""
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+
+def private_storage():
+    """Файлы вне MEDIA_ROOT: nginx их не раздает, API отдает их только
+    владельцу"""
+    return FileSystemStorage(location=settings.PRIVATE_MEDIA_ROOT)
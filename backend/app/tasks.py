@@ -0,0 +1,116 @@
+"""Фоновые задачи без внешнего брокера.
+
+Картинки обрабатываются в пуле потоков веб-процесса. Выгрузки списков
+покупок (рендер PDF нагружает процессор и держал бы GIL веб-процесса)
+только ставятся в очередь в базе, выполняет их отдельный процесс
+process_shopping_exports --poll. Картинки, потерянные при перезапуске,
+дорабатывает make_thumbnails.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from app.images import delete_thumbnails, make_thumbnails, normalize_image
+from app.models import Recipe, ShoppingExport
+from app.servises import get_shopping_digest, get_shopping_file
+from app.snapshots import response_generation
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                thread_name_prefix='foodgram-worker',
+            )
+    return _executor
+
+
+def run_task(func, *args):
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', func)
+    finally:
+        close_old_connections()
+
+
+def submit(func, *args):
+    """Запускает задачу после фиксации текущей транзакции"""
+    transaction.on_commit(
+        lambda: get_executor().submit(run_task, func, *args))
+
+
+def enqueue_shopping_export(user, export_format):
+    """Ставит выгрузку в очередь, ее заберет process_shopping_exports"""
+    return ShoppingExport.objects.create(
+        user=user, export_format=export_format)
+
+
+def process_shopping_export(job_id):
+    """Выполняет выгрузку, если ее еще не забрал другой процесс"""
+    started = ShoppingExport.objects.filter(
+        pk=job_id, status=ShoppingExport.PENDING
+    ).update(status=ShoppingExport.RUNNING, started=timezone.now())
+    if not started:
+        return False
+    job = ShoppingExport.objects.select_related('user').get(pk=job_id)
+    try:
+        digest, _, shopping_list = get_shopping_digest(job.user)
+        output = get_shopping_file(
+            job.user, job.export_format, digest, shopping_list)
+        with output:
+            # Случайное имя: по id выгрузку не подобрать
+            job.file.save(
+                f'{uuid4().hex}.{job.export_format}', File(output),
+                save=False)
+        job.status = ShoppingExport.DONE
+    except Exception as error:
+        logger.exception('Не удалось выгрузить список покупок %s', job_id)
+        job.status = ShoppingExport.FAILED
+        job.error = str(error)
+    job.finished = timezone.now()
+    job.save(update_fields=('file', 'status', 'error', 'finished'))
+    return True
+
+
+def process_recipe_image(recipe_id):
+    """Пережимает картинку рецепта и рисует миниатюры.
+
+    До завершения списки показывают заглушку. Если картинку успели
+    заменить, результат выбрасывается.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    original = recipe.image.name
+    with recipe.image.open('rb') as f:
+        normalized = normalize_image(File(f, name=original))
+    name = default_storage.save(
+        os.path.join(os.path.dirname(original), f'{uuid4()}.jpg'), normalized)
+    make_thumbnails(name)
+    updated = Recipe.objects.filter(pk=recipe_id, image=original).update(
+        image=name, image_processed=True)
+    if not updated:
+        default_storage.delete(name)
+        delete_thumbnails(name)
+        return
+    # update() не отправляет сигналы, а ссылка на картинку в ответах сменилась
+    response_generation.invalidate()
+    if not Recipe.objects.filter(image=original).exists():
+        default_storage.delete(original)
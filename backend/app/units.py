@@ -0,0 +1,46 @@
+"""Единицы измерения ингредиентов и перевод количеств в базовые.
+
+Ингредиенты хранят единицу строкой measurement_unit (ее отдает API) и
+ссылкой на Unit с множителем. Список покупок суммирует количества,
+переведенные в базовые единицы, одним запросом. Стандартные единицы
+и множители заводит миграция 0018_fill_units, остальные правятся в админке.
+"""
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from app.models import Ingredient, Unit
+
+
+def base_unit_name(prefix=''):
+    """Название базовой единицы ингредиента по пути prefix"""
+    return Coalesce(
+        f'{prefix}unit__base__name',
+        f'{prefix}unit__name',
+        f'{prefix}measurement_unit',
+    )
+
+
+def base_amount(amount='amount', prefix='ingredient__'):
+    """Количество amount, переведенное в базовую единицу ингредиента"""
+    return F(amount) * Coalesce(f'{prefix}unit__factor', Value(1))
+
+
+def link_units(ingredients=None):
+    """Проставляет ингредиентам единицы по measurement_unit.
+
+    Нужна после массовых загрузок: bulk_create не вызывает save().
+    Недостающие единицы создаются без перевода в базовые.
+    Возвращает число обновленных ингредиентов.
+    """
+    if ingredients is None:
+        ingredients = Ingredient.objects.all()
+    stale = ingredients.filter(
+        Q(unit__isnull=True) | ~Q(unit__name=F('measurement_unit')))
+    names = set(stale.values_list('measurement_unit', flat=True).distinct())
+    if not names:
+        return 0
+    Unit.objects.bulk_create(
+        [Unit(name=name) for name in names], ignore_conflicts=True)
+    return Ingredient.objects.filter(pk__in=stale.values('pk')).update(
+        unit=Subquery(Unit.objects.filter(
+            name=OuterRef('measurement_unit')).values('pk')[:1]))
@@ -0,0 +1,61 @@
+"""Избранное, корзина и подписки пользователя одним набором.
+
+Набор загружается одним запросом на HTTP-запрос и, если задан
+USER_STATE_CACHE_TIMEOUT, хранится в общем кеше до изменения
+избранного, корзины или подписок (см. app.signals).
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Value
+
+from app.models import Favorite, Shopping, Subscription
+
+USER_STATE_KEY = 'user_state:{}'
+
+UserState = namedtuple('UserState', ('favorites', 'cart', 'following'))
+
+EMPTY_STATE = UserState(frozenset(), frozenset(), frozenset())
+
+
+def load_user_state(user_id):
+    rows = Favorite.objects.filter(user_id=user_id).annotate(
+        kind=Value('favorites', output_field=CharField())
+    ).values_list('kind', 'recipe_id').union(
+        Shopping.objects.filter(user_id=user_id).annotate(
+            kind=Value('cart', output_field=CharField())
+        ).values_list('kind', 'recipe_id'),
+        Subscription.objects.filter(user_id=user_id).annotate(
+            kind=Value('following', output_field=CharField())
+        ).values_list('kind', 'author_id'),
+        all=True,
+    )
+    ids = {field: set() for field in UserState._fields}
+    for kind, pk in rows:
+        ids[kind].add(pk)
+    return UserState(**{
+        field: frozenset(values) for field, values in ids.items()})
+
+
+def get_user_state(request):
+    """Набор текущего пользователя, один на HTTP-запрос"""
+    if request is None or request.user.is_anonymous:
+        return EMPTY_STATE
+    state = getattr(request, '_user_state', None)
+    if state is not None:
+        return state
+    timeout = settings.USER_STATE_CACHE_TIMEOUT
+    key = USER_STATE_KEY.format(request.user.id)
+    if timeout:
+        state = cache.get(key)
+    if state is None:
+        state = load_user_state(request.user.id)
+        if timeout:
+            cache.set(key, state, timeout)
+    request._user_state = state
+    return state
+
+
+def forget_user_state(user_id):
+    cache.delete(USER_STATE_KEY.format(user_id))
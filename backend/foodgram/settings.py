@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -36,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'api.apps.ApiConfig',
     'app.apps.AppConfig',
     'users.apps.UsersConfig',
@@ -102,6 +104,37 @@ DATABASES = {
         }
 } 
 
+# Кеш должен быть общим для всех процессов (file или redis): через него
+# веб-процессы узнают о сбросе снимков, в том числе из команд manage.py.
+# locmem виден лишь своему процессу, годится только для одного процесса.
+# file - для разработки на одной машине: каждая запись в него перечисляет
+# всю папку кеша при отборе лишних ключей, а пишут в кеш ответы анонимам,
+# состояние пользователей, версии снимков и файлы списков покупок. incr в
+# нем не атомарен, поэтому индекс подбора по ингредиентам перезагружается
+# целиком при каждом изменении (см. IncrementalSnapshot).
+# В docker-compose по умолчанию redis
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', default='file')
+CACHE_BACKENDS = {
+    'locmem': (
+        'django.core.cache.backends.locmem.LocMemCache', 'foodgram'),
+    'file': (
+        'django.core.cache.backends.filebased.FileBasedCache',
+        os.path.join(tempfile.gettempdir(), 'foodgram-cache')),
+    'redis': (
+        'django.core.cache.backends.redis.RedisCache',
+        'redis://127.0.0.1:6379/1'),
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', default=CACHE_BACKENDS[CACHE_BACKEND][1]),
+        # По умолчанию file и locmem держат 300 ключей и при переполнении
+        # выбрасывают треть, вместе с версиями снимков
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -145,6 +178,9 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Файлы пользователей (выгрузки списков покупок) вне MEDIA_ROOT:
+# nginx раздает /media/ без проверки доступа
+PRIVATE_MEDIA_ROOT = os.path.join(BASE_DIR, 'private')
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -162,7 +198,7 @@ REST_FRAMEWORK = {
 
     ),
     'DEFAULT_PAGINATION_CLASS': (
-        'rest_framework.pagination.PageNumberPagination'
+        'api.pagination.LimitPageNumberPagination'
         ),
     'PAGE_SIZE': 6,
 }
@@ -180,3 +216,50 @@ DJOSER = {
         'current_user': 'api.serializers.CustomUserSerializer',
     },
 }
+
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+SHOPPING_FILE_SPOOL_SIZE = 1024 * 1024
+SHOPPING_FILE_CACHE_MAX_SIZE = 512 * 1024
+
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_SEARCH_FUZZY = True
+
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', default=2))
+
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+RECIPE_IMAGE_MAX_SIDE = 1920
+RECIPE_IMAGE_QUALITY = 85
+# Миниатюры для карточек: название -> наибольшая сторона в пикселях
+RECIPE_THUMBNAIL_SIZES = {'small': 240, 'medium': 480}
+RECIPE_THUMBNAIL_QUALITY = 80
+RECIPE_IMAGE_PLACEHOLDER = 'app/recipe-placeholder.svg'
+RECIPE_IMAGE_DECODE_CHUNK = 64 * 1024
+
+# Сколько секунд хранить в общем кеше избранное, корзину и подписки
+# пользователя, 0 - загружать на каждый запрос
+USER_STATE_CACHE_TIMEOUT = 5 * 60
+
+# Ответы для анонимов, сбрасываются сменой поколения при изменении данных
+RESPONSE_CACHE_TIMEOUT = 10 * 60
+# Очки популярности меняются через .update() без смены поколения, поэтому
+# ленты ?ordering=popular и trending хранятся недолго
+RESPONSE_CACHE_VOLATILE_TIMEOUT = 30
+
+# Очки рецепта за добавление в избранное и в корзину
+POPULAR_FAVORITE_POINTS = 2
+POPULAR_CART_POINTS = 1
+# Тренд: добавления за последние дни, вес убывает вдвое за период
+TRENDING_WINDOW_DAYS = 14
+TRENDING_HALF_LIFE_DAYS = 3
+TRENDING_PRECISION = 100
+
+# Конфигурация полнотекстового поиска рецептов PostgreSQL
+RECIPE_SEARCH_CONFIG = 'russian'
+# Сколько лучших рецептов отдает поиск в памяти (не на PostgreSQL)
+RECIPE_SEARCH_FALLBACK_LIMIT = 1000
+
+# Подбор рецептов по имеющимся ингредиентам: сколько ингредиентов можно
+# передать и сколько лучших рецептов ранжировать
+WHAT_TO_COOK_MAX_INGREDIENTS = 100
+WHAT_TO_COOK_LIMIT = 500
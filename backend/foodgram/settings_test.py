@@ -0,0 +1,30 @@
+"""Настройки для запуска тестов.
+
+Без переменной окружения DB_ENGINE тесты идут на SQLite,
+иначе используется база из основных настроек.
+"""
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+if not os.getenv('DB_ENGINE'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+    }
+
+# Тесты идут в одном процессе, общий файловый кеш между запусками не нужен
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'foodgram-tests',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-media-')
+PRIVATE_MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-private-')
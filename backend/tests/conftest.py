@@ -0,0 +1,139 @@
+import json
+import os
+import time
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from users.models import ADMIN, User
+
+from app.seeding import seed
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), 'budgets.json')
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmark', 'бюджеты запросов к API')
+    group.addoption('--bench-scale', type=int, default=1,
+                    help='Множитель размера синтетических данных')
+    group.addoption('--bench-rounds', type=int, default=5,
+                    help='Количество замеров на каждый эндпоинт')
+    group.addoption('--bench-budgets', default=BUDGETS_PATH,
+                    help='Файл с бюджетами эндпоинтов')
+    group.addoption('--bench-report', default=None,
+                    help='Сохранить результаты замеров в JSON')
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(0, int(round(percent / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+
+class BenchmarkRecorder:
+    """Замеряет запросы, время и размер ответа и сверяет их с бюджетом"""
+
+    def __init__(self, budgets, rounds):
+        self.budgets = budgets
+        self.rounds = rounds
+        self.results = {}
+
+    def measure(self, name, client, method, url, data=None, undo=None):
+        queries = []
+        timings = []
+        size = 0
+        response = None
+        for _ in range(self.rounds + 1):
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as context:
+                response = getattr(client, method)(url, data, format='json')
+                if getattr(response, 'streaming', False):
+                    size = sum(len(chunk) for chunk in response)
+                else:
+                    size = len(response.content)
+            timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+            if undo is not None:
+                undo()
+        # Первый проход прогревает кеши и в статистику не попадает
+        timings, queries = timings[1:], queries[1:]
+        result = {
+            'status': response.status_code,
+            'queries': max(queries),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'bytes': size,
+        }
+        self.results[name] = result
+        return response, result
+
+    def check(self, name):
+        budget = self.budgets[name]
+        result = self.results[name]
+        exceeded = [
+            f'{metric}: {result[metric]} > {budget[metric]}'
+            for metric in ('queries', 'p95_ms', 'bytes')
+            if metric in budget and result[metric] > budget[metric]
+        ]
+        assert not exceeded, f'{name} превысил бюджет: ' + ', '.join(exceeded)
+
+
+@pytest.fixture(scope='session')
+def bench_dataset(request, django_db_setup, django_db_blocker):
+    scale = request.config.getoption('--bench-scale')
+    with django_db_blocker.unblock():
+        created = seed(users=20 * scale, recipes=200 * scale)
+        user = User.objects.filter(
+            username__startswith='bench_user_').order_by('id').first()
+        user.role = ADMIN
+        user.save(update_fields=('role',))
+    created['user_id'] = user.id
+    return created
+
+
+@pytest.fixture(scope='session')
+def bench_recorder(request):
+    path = request.config.getoption('--bench-budgets')
+    with open(path, encoding='utf-8') as f:
+        budgets = json.load(f)
+    recorder = BenchmarkRecorder(
+        budgets, request.config.getoption('--bench-rounds'))
+    request.config._bench_recorder = recorder
+    return recorder
+
+
+@pytest.fixture
+def bench_user(bench_dataset, db):
+    return User.objects.get(id=bench_dataset['user_id'])
+
+
+@pytest.fixture
+def anon_client(bench_dataset, db):
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(bench_user):
+    client = APIClient()
+    client.force_authenticate(bench_user)
+    return client
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    recorder = getattr(config, '_bench_recorder', None)
+    if recorder is None or not recorder.results:
+        return
+    terminalreporter.section('API benchmark')
+    terminalreporter.write_line(
+        f'{"endpoint":<32}{"status":>7}{"queries":>9}'
+        f'{"p50 ms":>10}{"p95 ms":>10}{"bytes":>10}')
+    for name, result in sorted(recorder.results.items()):
+        terminalreporter.write_line(
+            f'{name:<32}{result["status"]:>7}{result["queries"]:>9}'
+            f'{result["p50_ms"]:>10}{result["p95_ms"]:>10}'
+            f'{result["bytes"]:>10}')
+    report = config.getoption('--bench-report')
+    if report:
+        with open(report, 'w', encoding='utf-8') as f:
+            json.dump(recorder.results, f, indent=2, sort_keys=True)
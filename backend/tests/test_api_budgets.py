@@ -0,0 +1,290 @@
+"""Бюджеты SQL-запросов, времени ответа и размера ответа для эндпоинтов API.
+
+Запуск с отчетом: pytest --bench-rounds=20 --bench-report=bench.json
+"""
+import pytest
+from users.models import User
+
+from app.models import (Favorite, Ingredient, Recipe, RecipeIngredientAmount,
+                        Shopping, ShoppingExport, Subscription, Tag)
+
+PNG = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAA'
+    'CVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNo'
+    'AAAAggCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+
+@pytest.fixture
+def recipe(bench_user):
+    return Recipe.objects.exclude(author=bench_user).order_by('id').first()
+
+
+@pytest.fixture
+def author(bench_user):
+    return User.objects.filter(
+        username__startswith='bench_user_').exclude(
+        id=bench_user.id).exclude(
+        following__user=bench_user).order_by('id').first()
+
+
+def test_tags_list(bench_recorder, anon_client, bench_dataset):
+    response, _ = bench_recorder.measure(
+        'tags-list', anon_client, 'get', '/api/tags/')
+    assert response.status_code == 200
+    bench_recorder.check('tags-list')
+
+
+def test_tags_detail(bench_recorder, anon_client, bench_dataset):
+    tag = Tag.objects.first()
+    response, _ = bench_recorder.measure(
+        'tags-detail', anon_client, 'get', f'/api/tags/{tag.id}/')
+    assert response.status_code == 200
+    bench_recorder.check('tags-detail')
+
+
+def test_ingredients_search(bench_recorder, anon_client, bench_dataset):
+    response, _ = bench_recorder.measure(
+        'ingredients-search', anon_client, 'get', '/api/ingredients/?name=ка')
+    assert response.status_code == 200
+    bench_recorder.check('ingredients-search')
+
+
+def test_ingredients_detail(bench_recorder, anon_client, bench_dataset):
+    ingredient = Ingredient.objects.first()
+    response, _ = bench_recorder.measure(
+        'ingredients-detail', anon_client, 'get',
+        f'/api/ingredients/{ingredient.id}/')
+    assert response.status_code == 200
+    bench_recorder.check('ingredients-detail')
+
+
+@pytest.mark.parametrize('name, client_fixture, url', [
+    ('recipes-list-anon', 'anon_client', '/api/recipes/'),
+    ('recipes-list', 'user_client', '/api/recipes/'),
+    ('recipes-list-deep', 'user_client', '/api/recipes/?page=20'),
+    ('recipes-list-cursor', 'user_client',
+     '/api/recipes/?pagination=cursor&limit=20'),
+    ('recipes-list-popular', 'user_client', '/api/recipes/?ordering=popular'),
+    ('recipes-list-trending-cursor', 'user_client',
+     '/api/recipes/?ordering=trending&pagination=cursor&limit=20'),
+    ('recipes-search', 'user_client', '/api/recipes/?search=рецепт'),
+    ('recipes-list-tags', 'user_client',
+     '/api/recipes/?tags=breakfast&tags=lunch&tags=dinner'),
+    ('recipes-list-favorited', 'user_client', '/api/recipes/?is_favorited=1'),
+    ('recipes-list-cart', 'user_client',
+     '/api/recipes/?is_in_shopping_cart=1'),
+])
+def test_recipes_list(bench_recorder, request, bench_dataset,
+                      name, client_fixture, url):
+    client = request.getfixturevalue(client_fixture)
+    response, _ = bench_recorder.measure(name, client, 'get', url)
+    assert response.status_code == 200
+    bench_recorder.check(name)
+
+
+def follow_pages(client, url):
+    """Ответы всех страниц ленты по ссылкам next"""
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append(response.json())
+        url = pages[-1]['next']
+    return pages
+
+
+@pytest.mark.parametrize('ordering', ['new', 'popular', 'trending'])
+def test_recipes_cursor_pages_do_not_overlap(user_client, bench_dataset,
+                                             ordering):
+    pages = follow_pages(
+        user_client,
+        f'/api/recipes/?ordering={ordering}&pagination=cursor&limit=20')
+    assert len(pages) > 1
+    ids = [recipe['id'] for page in pages for recipe in page['results']]
+    assert len(ids) == len(set(ids))
+    assert set(ids) == set(Recipe.objects.values_list('id', flat=True))
+
+
+def test_recipes_tags_filter_has_no_duplicates(user_client, bench_dataset):
+    slugs = ['breakfast', 'lunch', 'dinner']
+    tagged = Recipe.objects.filter(tags__slug__in=slugs)
+    # Рецепты с несколькими тегами из фильтра дали бы дубли при JOIN
+    assert tagged.count() > tagged.distinct().count()
+    pages = follow_pages(
+        user_client,
+        '/api/recipes/?' + '&'.join(f'tags={slug}' for slug in slugs)
+        + '&limit=30')
+    expected = set(tagged.values_list('id', flat=True))
+    assert pages[0]['count'] == len(expected)
+    ids = [recipe['id'] for page in pages for recipe in page['results']]
+    assert len(ids) == len(set(ids))
+    assert set(ids) == expected
+
+
+def test_recipes_what_to_cook(bench_recorder, user_client, bench_dataset):
+    ids = Ingredient.objects.order_by('id').values_list('id', flat=True)[:30]
+    response, _ = bench_recorder.measure(
+        'recipes-what-to-cook', user_client, 'get',
+        '/api/recipes/what_to_cook/?ingredients='
+        + ','.join(map(str, ids)))
+    assert response.status_code == 200
+    bench_recorder.check('recipes-what-to-cook')
+
+
+def test_recipes_detail(bench_recorder, user_client, recipe):
+    response, _ = bench_recorder.measure(
+        'recipes-detail', user_client, 'get', f'/api/recipes/{recipe.id}/')
+    assert response.status_code == 200
+    bench_recorder.check('recipes-detail')
+
+
+def test_recipes_create(bench_recorder, user_client, bench_user):
+    ingredients = Ingredient.objects.order_by('id')[:20]
+    payload = {
+        'name': 'Бенчмарк',
+        'text': 'Рецепт для замера',
+        'cooking_time': 10,
+        'image': PNG,
+        'tags': list(Tag.objects.values_list('id', flat=True)[:3]),
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 10} for ingredient in ingredients
+        ],
+    }
+    response, _ = bench_recorder.measure(
+        'recipes-create', user_client, 'post', '/api/recipes/', payload,
+        undo=lambda: Recipe.objects.filter(name='Бенчмарк').delete())
+    assert response.status_code == 201, response.content
+    bench_recorder.check('recipes-create')
+
+
+def test_recipes_update(bench_recorder, user_client, bench_user):
+    recipe = Recipe.objects.filter(author=bench_user).first()
+    ingredients = Ingredient.objects.order_by('-id')[:20]
+    payload = {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'image': PNG,
+        'tags': list(Tag.objects.values_list('id', flat=True)[:2]),
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 5} for ingredient in ingredients
+        ],
+    }
+    response, _ = bench_recorder.measure(
+        'recipes-update', user_client, 'patch',
+        f'/api/recipes/{recipe.id}/', payload)
+    assert response.status_code == 200, response.content
+    bench_recorder.check('recipes-update')
+
+
+def test_recipes_update_rows(user_client, bench_user):
+    recipe = Recipe.objects.filter(author=bench_user).order_by('id').last()
+    rows = list(RecipeIngredientAmount.objects.filter(
+        recipe=recipe).order_by('id'))
+    assert len(rows) >= 3
+    changed, *kept, dropped = rows
+    added = Ingredient.objects.exclude(
+        id__in=[row.ingredient_id for row in rows]).first()
+    amounts = {row.ingredient_id: row.amount for row in kept}
+    amounts[changed.ingredient_id] = changed.amount + 1
+    amounts[added.id] = 7
+    tags = list(Tag.objects.exclude(
+        id__in=recipe.tags.values('id')).values_list('id', flat=True)[:2])
+    response = user_client.patch(
+        f'/api/recipes/{recipe.id}/',
+        {
+            'tags': tags,
+            'ingredients': [
+                {'id': ingredient_id, 'amount': amount}
+                for ingredient_id, amount in amounts.items()
+            ],
+        },
+        format='json')
+    assert response.status_code == 200, response.content
+    saved = RecipeIngredientAmount.objects.filter(recipe=recipe)
+    assert dict(saved.values_list('ingredient_id', 'amount')) == amounts
+    # Строки без изменений остаются на месте, а не создаются заново
+    assert set(saved.filter(
+        ingredient_id__in=[row.ingredient_id for row in kept]
+    ).values_list('id', flat=True)) == {row.id for row in kept}
+    assert set(recipe.tags.values_list('id', flat=True)) == set(tags)
+
+
+@pytest.mark.parametrize('name, url', [
+    ('download-shopping-cart', '/api/recipes/download_shopping_cart/'),
+    ('download-shopping-cart-txt',
+     '/api/recipes/download_shopping_cart/?format=txt'),
+])
+def test_download_shopping_cart(bench_recorder, user_client, bench_user,
+                                name, url):
+    response, _ = bench_recorder.measure(name, user_client, 'get', url)
+    assert response.status_code == 200
+    bench_recorder.check(name)
+
+
+def test_shopping_export_create(bench_recorder, user_client, bench_user):
+    response, _ = bench_recorder.measure(
+        'shopping-export-create', user_client, 'post',
+        '/api/shopping_cart_exports/', {'format': 'txt'},
+        undo=lambda: ShoppingExport.objects.filter(user=bench_user).delete())
+    assert response.status_code == 202
+    bench_recorder.check('shopping-export-create')
+
+
+def test_favorite_create(bench_recorder, user_client, bench_user, recipe):
+    Favorite.objects.filter(user=bench_user, recipe=recipe).delete()
+    response, _ = bench_recorder.measure(
+        'favorite-create', user_client, 'post',
+        f'/api/recipes/{recipe.id}/favorite/',
+        undo=lambda: Favorite.objects.filter(
+            user=bench_user, recipe=recipe).delete())
+    assert response.status_code == 201
+    bench_recorder.check('favorite-create')
+
+
+def test_shopping_cart_create(bench_recorder, user_client, bench_user,
+                              recipe):
+    Shopping.objects.filter(user=bench_user, recipe=recipe).delete()
+    response, _ = bench_recorder.measure(
+        'shopping-cart-create', user_client, 'post',
+        f'/api/recipes/{recipe.id}/shopping_cart/',
+        undo=lambda: Shopping.objects.filter(
+            user=bench_user, recipe=recipe).delete())
+    assert response.status_code == 201
+    bench_recorder.check('shopping-cart-create')
+
+
+@pytest.mark.parametrize('name, url', [
+    ('subscriptions-list', '/api/users/subscriptions/'),
+    ('subscriptions-list-limit',
+     '/api/users/subscriptions/?limit=50&recipes_limit=3'),
+])
+def test_subscriptions_list(bench_recorder, user_client, bench_user,
+                            name, url):
+    response, _ = bench_recorder.measure(name, user_client, 'get', url)
+    assert response.status_code == 200
+    bench_recorder.check(name)
+
+
+def test_subscribe(bench_recorder, user_client, bench_user, author):
+    response, _ = bench_recorder.measure(
+        'subscribe', user_client, 'post',
+        f'/api/users/{author.id}/subscribe/',
+        undo=lambda: Subscription.objects.filter(
+            user=bench_user, author=author).delete())
+    assert response.status_code == 201
+    bench_recorder.check('subscribe')
+
+
+@pytest.mark.parametrize('name, client_fixture, url', [
+    ('users-list', 'anon_client', '/api/users/'),
+    ('users-list-auth', 'user_client', '/api/users/?limit=50'),
+    ('users-me', 'user_client', '/api/users/me/'),
+])
+def test_users(bench_recorder, request, bench_dataset,
+               name, client_fixture, url):
+    client = request.getfixturevalue(client_fixture)
+    response, _ = bench_recorder.measure(name, client, 'get', url)
+    assert response.status_code == 200
+    bench_recorder.check(name)
@@ -0,0 +1,33 @@
+"""Кеш ответов для анонимов"""
+import pytest
+from django.core.cache import cache
+
+from app.models import Recipe
+from app.popularity import RANK_SCALE, change_popularity
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def test_feed_is_served_from_cache(anon_client):
+    url = '/api/recipes/?ordering=new'
+    assert anon_client.get(url)['X-Cache'] == 'MISS'
+    assert anon_client.get(url)['X-Cache'] == 'HIT'
+
+
+def test_popular_feed_follows_points(anon_client, settings):
+    settings.RESPONSE_CACHE_VOLATILE_TIMEOUT = 0
+    url = '/api/recipes/?ordering=popular&limit=1'
+    first = anon_client.get(url).json()['results'][0]['id']
+    # Очки меняются через .update(), поколение ответов остается прежним
+    bottom = Recipe.objects.order_by('popular_rank').first()
+    top = Recipe.objects.get(pk=first)
+    change_popularity(
+        bottom.id, (top.popular_rank - bottom.popular_rank) // RANK_SCALE + 1)
+    response = anon_client.get(url)
+    assert response['X-Cache'] == 'MISS'
+    assert response.json()['results'][0]['id'] == bottom.id
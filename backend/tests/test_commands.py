@@ -0,0 +1,127 @@
+"""Команды управления"""
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from app.models import Favorite, Ingredient, Recipe
+
+
+def test_explain_feed_without_favorites(bench_dataset, db):
+    Favorite.objects.all().delete()
+    with pytest.raises(CommandError, match='--user'):
+        call_command('explain_feed')
+
+
+def test_explain_feed_unknown_user(bench_dataset, db):
+    with pytest.raises(CommandError, match='не найден'):
+        call_command('explain_feed', user=10 ** 9)
+
+
+def recipe_snapshot(recipe):
+    return (
+        recipe.author.username,
+        recipe.name,
+        recipe.pub_date,
+        sorted(tag.slug for tag in recipe.tags.all()),
+        sorted(
+            (row.ingredient.name, row.ingredient.measurement_unit, row.amount)
+            for row in recipe.recipe_ingredients.all()
+        ),
+    )
+
+
+def export_records(path):
+    call_command('export_recipes', path=str(path), stderr=StringIO())
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def write_records(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def test_export_import_round_trip(bench_dataset, db, tmp_path):
+    path = tmp_path / 'recipes.jsonl'
+    records = export_records(path)
+    total = Recipe.objects.count()
+    assert len(records) == total
+    removed = Recipe.objects.with_related().order_by('id')[:3]
+    expected = sorted(recipe_snapshot(recipe) for recipe in removed)
+    Recipe.objects.filter(pk__in=[recipe.id for recipe in removed]).delete()
+    out = StringIO()
+    call_command('import_recipes', path=str(path), stdout=out)
+    # Остальные рецепты из файла уже есть в базе и пропускаются
+    assert f'Добавлено рецептов: 3, пропущено: {total - 3}' in out.getvalue()
+    assert Recipe.objects.count() == total
+    imported = Recipe.objects.with_related().order_by('-id')[:3]
+    assert sorted(recipe_snapshot(recipe) for recipe in imported) == expected
+
+
+def test_import_resumes_after_failed_batch(bench_dataset, db, tmp_path):
+    path = tmp_path / 'recipes.jsonl'
+    records = export_records(path)[:3]
+    for number, record in enumerate(records):
+        record['name'] = f'Повторная загрузка {number}'
+    broken = dict(records[2])
+    del broken['ingredients']
+    write_records(path, records[:2] + [broken])
+    with pytest.raises(CommandError, match='повторном запуске'):
+        call_command('import_recipes', path=str(path), batch_size=1,
+                     stdout=StringIO())
+    assert Recipe.objects.filter(
+        name__startswith='Повторная загрузка').count() == 2
+    write_records(path, records)
+    out = StringIO()
+    call_command('import_recipes', path=str(path), batch_size=1, stdout=out)
+    assert 'Добавлено рецептов: 1, пропущено: 2' in out.getvalue()
+    assert sorted(Recipe.objects.filter(
+        name__startswith='Повторная загрузка').values_list(
+        'name', flat=True)) == [f'Повторная загрузка {n}' for n in range(3)]
+
+
+def import_csv(path, **options):
+    out = StringIO()
+    call_command('import_csv', path=str(path), stdout=out, **options)
+    return out.getvalue()
+
+
+def test_import_csv_rerun_ignores_existing(db, tmp_path):
+    path = tmp_path / 'ingredients.csv'
+    path.write_text('Тестовая соль,г\nТестовый сахар,кг\n', encoding='utf-8')
+    assert 'добавлено ингредиентов: 2' in import_csv(path)
+    path.write_text('Тестовая соль,кг\nТестовый перец,г\n', encoding='utf-8')
+    output = import_csv(path)
+    assert 'добавлено ингредиентов: 1, пропущено или обновлено: 1' in output
+    # Без --update единица существующего ингредиента не меняется
+    salt = Ingredient.objects.get(name='Тестовая соль')
+    assert salt.measurement_unit == 'г'
+    assert salt.unit.name == 'г'
+
+
+def test_import_csv_update(db, tmp_path):
+    path = tmp_path / 'ingredients.csv'
+    path.write_text('Тестовая соль,г\n', encoding='utf-8')
+    import_csv(path)
+    path.write_text('Тестовая соль,кг\n', encoding='utf-8')
+    assert 'добавлено ингредиентов: 0' in import_csv(path, update=True)
+    salt = Ingredient.objects.get(name='Тестовая соль')
+    assert salt.measurement_unit == 'кг'
+    # Единица с множителем проставляется и после обновления мимо save()
+    assert salt.unit.name == 'кг'
+
+
+@pytest.mark.parametrize('update', [False, True])
+def test_import_csv_duplicates_in_batch(db, tmp_path, update):
+    path = tmp_path / 'ingredients.csv'
+    path.write_text(
+        'Тестовая соль,г\nТестовая соль,кг\n Тестовая соль ,мл\n',
+        encoding='utf-8')
+    output = import_csv(path, update=update, batch_size=10)
+    assert 'Прочитано строк: 3, добавлено ингредиентов: 1' in output
+    salt = Ingredient.objects.get(name='Тестовая соль')
+    # В пачке остается последняя строка с этим названием
+    assert salt.measurement_unit == 'мл'
@@ -0,0 +1,151 @@
+"""Подбор рецептов по ингредиентам: обновление индекса по журналу
+изменений и порядок выдачи"""
+from uuid import uuid4
+
+import pytest
+from django.core.cache import cache
+from users.models import User
+
+from app.cook_index import CookIndex, cook_index
+from app.models import Ingredient, Recipe, RecipeIngredientAmount
+from app.snapshots import IncrementalSnapshot
+
+
+def as_lists(index):
+    return (
+        {key: list(ids) for key, ids in index.postings.items()},
+        {key: list(ids) for key, ids in index.recipes.items()},
+    )
+
+
+@pytest.fixture
+def kitchen(bench_dataset, db):
+    """Рецепты на своих ингредиентах, которых нет в остальных данных:
+    first - a, b; second - c; third - b, c, d"""
+    author = User.objects.get(id=bench_dataset['user_id'])
+    a, b, c, d = (
+        Ingredient.objects.create(
+            name=f'Ингредиент подбора {name}', measurement_unit='г')
+        for name in 'abcd')
+    recipes = []
+    for ingredients in ((a, b), (c,), (b, c, d)):
+        recipe = Recipe.objects.create(
+            name='Подбор', author=author, text='-', cooking_time=5)
+        for ingredient in ingredients:
+            RecipeIngredientAmount.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1)
+        recipes.append(recipe)
+    yield (a, b, c, d), recipes
+    # Транзакция теста откатывается, копия индекса в процессе устарела
+    cook_index.invalidate()
+
+
+def test_updated_matches_load(kitchen):
+    (a, b, c, d), (first, second, third) = kitchen
+    index = CookIndex.load()
+    # a уходит из единственного рецепта и в том же обновлении
+    # появляется в следующем
+    RecipeIngredientAmount.objects.filter(
+        recipe=first, ingredient=a).delete()
+    RecipeIngredientAmount.objects.create(
+        recipe=first, ingredient=d, amount=1)
+    RecipeIngredientAmount.objects.create(
+        recipe=second, ingredient=a, amount=1)
+    updated = index.updated([first.id, second.id])
+    assert as_lists(updated) == as_lists(CookIndex.load())
+    assert list(updated.postings[a.id]) == [second.id]
+    # Старый индекс не изменился
+    assert list(index.postings[a.id]) == [first.id]
+
+
+def test_updated_drops_emptied_postings(kitchen):
+    (a, b, c, d), (first, second, third) = kitchen
+    index = CookIndex.load()
+    RecipeIngredientAmount.objects.filter(recipe=first).delete()
+    updated = index.updated([first.id])
+    assert a.id not in updated.postings
+    assert first.id not in updated.recipes
+    assert as_lists(updated) == as_lists(CookIndex.load())
+
+
+def test_search_orders_by_coverage(kitchen):
+    (a, b, c, d), (first, second, third) = kitchen
+    found = CookIndex.load().search([b.id, c.id, d.id])
+    # При равной доле выше рецепт, где совпало больше ингредиентов
+    assert found == [
+        (third.id, 1.0, 3, 3),
+        (second.id, 1.0, 1, 1),
+        (first.id, 0.5, 1, 2),
+    ]
+    assert CookIndex.load().search([b.id, c.id, d.id], 0.75, 1) == [
+        (third.id, 1.0, 3, 3)]
+
+
+def test_what_to_cook_missing(kitchen, anon_client,
+                              django_capture_on_commit_callbacks):
+    (a, b, c, d), (first, second, third) = kitchen
+    cook_index.invalidate()
+    cook_index.get()
+    # Изменение состава доходит до индекса через журнал изменений
+    with django_capture_on_commit_callbacks(execute=True):
+        RecipeIngredientAmount.objects.create(
+            recipe=first, ingredient=c, amount=1)
+    response = anon_client.get(
+        f'/api/recipes/what_to_cook/?ingredients={a.id},{c.id}')
+    assert response.status_code == 200
+    results = [
+        (recipe['id'], recipe['missing'])
+        for recipe in response.json()['results']
+    ]
+    assert results == [(second.id, 0), (first.id, 1), (third.id, 2)]
+
+
+class Snapshot(IncrementalSnapshot):
+    """Снимок со счетчиком загрузок и журналом примененных ключей"""
+
+    def __init__(self, name):
+        self.loads = 0
+        self.updates = []
+        super().__init__(name, self.load, self.update)
+
+    def load(self):
+        self.loads += 1
+        return self.loads
+
+    def update(self, data, keys):
+        self.updates.append(keys)
+        return data
+
+
+def test_snapshot_applies_change_log():
+    snapshot = Snapshot(f'test:{uuid4().hex}')
+    snapshot.get()
+    snapshot.changed([1])
+    snapshot.changed([2])
+    snapshot.get()
+    assert snapshot.loads == 1
+    assert snapshot.updates == [{1, 2}]
+
+
+def test_snapshot_reloads_when_version_is_taken():
+    snapshot = Snapshot(f'test:{uuid4().hex}')
+    snapshot.get()
+    # Другой процесс уже записал изменения под следующим номером
+    cache.set(f'{snapshot.changes_prefix}:{snapshot.version + 1}', [1])
+    snapshot.changed([2])
+    snapshot.get()
+    assert snapshot.loads == 2
+    assert snapshot.updates == []
+
+
+def test_snapshot_reloads_without_atomic_incr(settings, tmp_path):
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(tmp_path),
+    }}
+    snapshot = Snapshot(f'test:{uuid4().hex}')
+    snapshot.get()
+    snapshot.changed([1])
+    snapshot.get()
+    assert snapshot.loads == 2
+    assert snapshot.updates == []
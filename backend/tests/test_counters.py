@@ -0,0 +1,76 @@
+"""Счетчики и ключи популярности в колонках"""
+from io import StringIO
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+from api.serializers import RecipeCreateSerializer
+from app.models import Favorite, Recipe, Subscription
+from app.popularity import RANK_SCALE, rank_points
+
+
+@pytest.fixture
+def recipe(bench_user):
+    return Recipe.objects.exclude(author=bench_user).exclude(
+        favorites__user=bench_user).order_by('id').first()
+
+
+def test_recipe_save_keeps_counters(bench_user, recipe):
+    loaded = Recipe.objects.get(pk=recipe.pk)
+    # Пока объект в памяти, рецепт добавляют в избранное
+    Favorite.objects.create(user=bench_user, recipe=recipe)
+    request = APIRequestFactory().patch('/')
+    request.user = recipe.author
+    serializer = RecipeCreateSerializer(
+        loaded, data={'name': 'Новое название'}, partial=True,
+        context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    recipe.refresh_from_db()
+    assert recipe.name == 'Новое название'
+    assert recipe.favorites_count == loaded.favorites_count + 1
+    assert recipe.popular_rank > loaded.popular_rank
+
+
+def test_user_save_keeps_counters(bench_user):
+    author = User.objects.filter(username__startswith='bench_user_').exclude(
+        id=bench_user.id).exclude(following__user=bench_user).first()
+    Subscription.objects.create(user=bench_user, author=author)
+    author.first_name = 'Другое имя'
+    author.save()
+    fresh = User.objects.get(pk=author.pk)
+    assert fresh.first_name == 'Другое имя'
+    assert fresh.followers_count == author.followers_count + 1
+
+
+def test_favorite_moves_count_and_rank(bench_user, recipe):
+    before = Recipe.objects.get(pk=recipe.pk)
+    favorite = Favorite.objects.create(user=bench_user, recipe=recipe)
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == before.favorites_count + 1
+    assert rank_points(recipe.popular_rank) == (
+        rank_points(before.popular_rank) + settings.POPULAR_FAVORITE_POINTS)
+    # Ключ остается уникальным: младшие разряды - id рецепта
+    assert recipe.popular_rank % RANK_SCALE == recipe.id
+    favorite.delete()
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == before.favorites_count
+    assert recipe.popular_rank == before.popular_rank
+
+
+def test_recount_repairs_drift(bench_user, recipe):
+    Recipe.objects.filter(pk=recipe.pk).update(favorites_count=999)
+    User.objects.filter(pk=recipe.author_id).update(
+        recipes_count=0, followers_count=999)
+    call_command('recount', stdout=StringIO())
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == Favorite.objects.filter(
+        recipe=recipe).count()
+    author = User.objects.get(pk=recipe.author_id)
+    assert author.recipes_count == Recipe.objects.filter(
+        author=author).count()
+    assert author.followers_count == Subscription.objects.filter(
+        author=author).count()
@@ -0,0 +1,28 @@
+"""Раскодирование картинок из base64 кусками"""
+import base64
+import os
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image
+
+from api.fields import decode_base64
+
+
+def test_decode_wrapped_base64_larger_than_chunk():
+    # Шум почти не сжимается, PNG выходит больше одного куска
+    image = Image.frombytes('RGB', (256, 256), os.urandom(256 * 256 * 3))
+    buffer = BytesIO()
+    image.save(buffer, 'PNG')
+    raw = buffer.getvalue()
+    assert len(raw) > settings.RECIPE_IMAGE_DECODE_CHUNK
+    # Перенос строк каждые 76 символов, как в MIME
+    wrapped = base64.encodebytes(raw).decode()
+    assert '\n' in wrapped
+    file = decode_base64(f'data:image/png;base64,{wrapped}')
+    try:
+        assert file.size == len(raw)
+        assert file.read() == raw
+        assert file.content_type == 'image/png'
+    finally:
+        file.close()
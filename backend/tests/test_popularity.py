@@ -0,0 +1,36 @@
+"""Лента по популярности и тренду"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from app.models import Favorite, Recipe
+from app.popularity import RANK_SCALE, rank_points, refresh_trending
+
+
+def test_refresh_trending_changes_only_new_points(user_client, bench_user):
+    # Все события сида остаются за окном тренда
+    now = timezone.now() + timedelta(days=365)
+    refresh_trending(now=now)
+    assert not Recipe.objects.filter(trending_rank__gte=RANK_SCALE).exists()
+    fresh, old = Recipe.objects.exclude(
+        favorites__user=bench_user).order_by('id')[:2]
+    for recipe, age in ((fresh, 1), (old, 10)):
+        favorite = Favorite.objects.create(user=bench_user, recipe=recipe)
+        Favorite.objects.filter(pk=favorite.pk).update(
+            created=now - timedelta(days=age))
+    untouched = dict(Recipe.objects.exclude(
+        pk__in=(fresh.pk, old.pk)).values_list('id', 'trending_rank'))
+    assert refresh_trending(now=now)[1] == 2
+    assert dict(Recipe.objects.exclude(
+        pk__in=(fresh.pk, old.pk)).values_list(
+        'id', 'trending_rank')) == untouched
+    fresh.refresh_from_db()
+    old.refresh_from_db()
+    # Одно и то же событие весит тем меньше, чем оно старше
+    assert rank_points(fresh.trending_rank) > rank_points(
+        old.trending_rank) > 0
+    response = user_client.get('/api/recipes/?ordering=trending&limit=2')
+    assert [recipe['id'] for recipe in response.json()['results']] == [
+        fresh.id, old.id]
+    # Повторный пересчет с тем же временем ничего не меняет
+    assert refresh_trending(now=now)[1] == 0
@@ -0,0 +1,49 @@
+"""Поиск рецептов без PostgreSQL: индекс в памяти и веса частей рецепта"""
+import pytest
+from users.models import User
+
+from app.models import Ingredient, Recipe, RecipeIngredientAmount
+from app.search import RecipeSearchIndex, recipe_search_index
+
+
+def test_index_weights_name_above_text():
+    index = RecipeSearchIndex(
+        [(1, 'Квазарный суп', 'Варить час'),
+         (2, 'Суп', 'Квазарные гренки подать отдельно')],
+        [(3, 'Квазарная соль')],
+    )
+    assert index.search('квазарный', 10) == [(1, 1.0), (3, 0.4), (2, 0.2)]
+    # Нужны все слова запроса, веса частей складываются
+    [(pk, score)] = index.search('квазарный час', 10)
+    assert pk == 1
+    assert score == pytest.approx(1.2)
+
+
+@pytest.fixture
+def recipes(bench_dataset, db, django_capture_on_commit_callbacks):
+    author = User.objects.get(id=bench_dataset['user_id'])
+    with django_capture_on_commit_callbacks(execute=True):
+        # Совпадение только в описании добавлено последним и в ленте
+        # оказалось бы первым
+        by_name = Recipe.objects.create(
+            name='Квазарный суп', author=author, text='Варить час',
+            cooking_time=5)
+        by_ingredient = Recipe.objects.create(
+            name='Салат', author=author, text='Нарезать', cooking_time=5)
+        RecipeIngredientAmount.objects.create(
+            recipe=by_ingredient, amount=1,
+            ingredient=Ingredient.objects.create(
+                name='Квазарная соль', measurement_unit='г'))
+        by_text = Recipe.objects.create(
+            name='Суп', author=author,
+            text='Квазарные гренки подать отдельно', cooking_time=5)
+    yield by_name, by_ingredient, by_text
+    # Транзакция теста откатывается, индекс в процессе устарел
+    recipe_search_index.invalidate()
+
+
+def test_search_ranks_name_above_text(anon_client, recipes):
+    response = anon_client.get('/api/recipes/?search=квазарный')
+    assert response.status_code == 200
+    assert [recipe['id'] for recipe in response.json()['results']] == [
+        recipe.id for recipe in recipes]
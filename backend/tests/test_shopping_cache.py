@@ -0,0 +1,40 @@
+"""Сброс закешированных отпечатков списка покупок"""
+from django.core.cache import cache
+
+from app.models import Recipe, RecipeIngredientAmount, Shopping
+from app.servises import (SHOPPING_DIGEST_KEY, SHOPPING_RECIPE_KEY,
+                          get_shopping_digest)
+
+
+def test_digest_reset_after_commit(bench_user,
+                                   django_capture_on_commit_callbacks):
+    get_shopping_digest(bench_user)
+    key = SHOPPING_DIGEST_KEY.format(bench_user.id)
+    recipe = Recipe.objects.exclude(purchases__user=bench_user).first()
+    with django_capture_on_commit_callbacks() as callbacks:
+        Shopping.objects.create(user=bench_user, recipe=recipe)
+    # До фиксации параллельный запрос видит старую корзину: отпечаток,
+    # сброшенный раньше времени, он закешировал бы заново
+    assert cache.get(key) is not None
+    for callback in callbacks:
+        callback()
+    assert cache.get(key) is None
+
+
+def test_recipe_version_changes_after_commit(
+        bench_user, django_capture_on_commit_callbacks):
+    row = RecipeIngredientAmount.objects.filter(
+        recipe__purchases__user=bench_user).first()
+    key = SHOPPING_RECIPE_KEY.format(row.recipe_id)
+    get_shopping_digest(bench_user)
+    version = cache.get(key)
+    assert version is not None
+    with django_capture_on_commit_callbacks() as callbacks:
+        row.amount += 1
+        row.save()
+    assert cache.get(key) == version
+    for callback in callbacks:
+        callback()
+    assert cache.get(key) != version
+    # Отпечаток с прежней версией рецепта больше не действителен
+    assert get_shopping_digest(bench_user)[2] is not None
@@ -0,0 +1,121 @@
+"""Выгрузки списка покупок: очередь в базе, файл лежит вне MEDIA_ROOT
+и отдается только владельцу"""
+import csv
+import json
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import User
+
+from app.models import Shopping, ShoppingExport
+from app.servises import get_shopping_list
+from app.tasks import process_shopping_export
+
+
+@pytest.fixture
+def other_client(bench_user):
+    other = User.objects.filter(
+        username__startswith='bench_user_').exclude(
+        id=bench_user.id).order_by('id').first()
+    client = APIClient()
+    client.force_authenticate(other)
+    return client
+
+
+@pytest.fixture
+def export(user_client, bench_user):
+    assert Shopping.objects.filter(user=bench_user).exists()
+    response = user_client.post(
+        '/api/shopping_cart_exports/', {'format': 'txt'}, format='json')
+    assert response.status_code == 202
+    job_id = response.json()['id']
+    # Очередь разбирает отдельный процесс, здесь выполняем задачу сами
+    assert process_shopping_export(job_id)
+    return ShoppingExport.objects.get(pk=job_id)
+
+
+def test_export_file_is_not_public(user_client, export):
+    assert export.status == ShoppingExport.DONE
+    path = export.file.path
+    assert path.startswith(settings.PRIVATE_MEDIA_ROOT)
+    assert not path.startswith(settings.MEDIA_ROOT)
+    assert f'{export.user_id}-{export.id}' not in export.file.name
+    data = user_client.get(f'/api/shopping_cart_exports/{export.id}/').json()
+    assert data['file'].endswith(
+        f'/api/shopping_cart_exports/{export.id}/download/')
+
+
+def test_export_download_only_for_owner(user_client, other_client, export):
+    url = f'/api/shopping_cart_exports/{export.id}/download/'
+    response = user_client.get(url)
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/plain; charset=utf-8'
+    assert b''.join(response.streaming_content).startswith(
+        'Список покупок'.encode())
+    assert other_client.get(url).status_code == 404
+    assert APIClient().get(url).status_code == 401
+
+
+def test_export_download_not_ready(user_client, bench_user):
+    job = ShoppingExport.objects.create(user=bench_user, export_format='txt')
+    response = user_client.get(
+        f'/api/shopping_cart_exports/{job.id}/download/')
+    assert response.status_code == 404
+
+
+def test_worker_requeues_by_start_time(bench_user):
+    now = timezone.now()
+    # Долго ждала в очереди, но начата только что: не трогаем
+    fresh = ShoppingExport.objects.create(
+        user=bench_user, export_format='txt',
+        status=ShoppingExport.RUNNING, started=now)
+    stale = ShoppingExport.objects.create(
+        user=bench_user, export_format='txt',
+        status=ShoppingExport.RUNNING, started=now - timedelta(hours=1))
+    ShoppingExport.objects.filter(pk__in=(fresh.pk, stale.pk)).update(
+        created=now - timedelta(days=1))
+    queued = ShoppingExport.objects.create(
+        user=bench_user, export_format='csv')
+    call_command('process_shopping_exports', stdout=StringIO())
+    fresh.refresh_from_db()
+    stale.refresh_from_db()
+    queued.refresh_from_db()
+    assert fresh.status == ShoppingExport.RUNNING
+    assert stale.status == ShoppingExport.DONE
+    assert queued.status == ShoppingExport.DONE
+    assert queued.started is not None
+
+
+@pytest.mark.parametrize('export_format', ['pdf', 'txt', 'csv'])
+def test_download_cart_errors_are_json(anon_client, export_format):
+    response = anon_client.get(
+        f'/api/recipes/download_shopping_cart/?format={export_format}')
+    assert response.status_code == 401
+    assert response['Content-Type'] == 'application/json'
+    assert 'detail' in response.json()
+
+
+@pytest.mark.parametrize('export_format', ['txt', 'csv', 'json'])
+def test_download_cart_text_formats(user_client, bench_user, export_format):
+    shopping_list = get_shopping_list(bench_user)
+    assert shopping_list
+    response = user_client.get(
+        f'/api/recipes/download_shopping_cart/?format={export_format}')
+    assert response.status_code == 200
+    content = b''.join(response.streaming_content).decode()
+    names = [name for name, _, _ in shopping_list]
+    if export_format == 'txt':
+        lines = content.splitlines()
+        assert lines[0] == 'Список покупок'
+        assert len(lines) == len(shopping_list) + 2
+    elif export_format == 'csv':
+        rows = list(csv.reader(content.splitlines()))
+        assert rows[0] == ['name', 'measurement_unit', 'amount']
+        assert [row[0] for row in rows[1:]] == names
+    else:
+        assert [item['name'] for item in json.loads(content)] == names
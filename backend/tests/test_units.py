@@ -0,0 +1,28 @@
+"""Перевод количеств в базовые единицы в списке покупок"""
+from users.models import User
+
+from app.models import Ingredient, Recipe, RecipeIngredientAmount, Shopping
+from app.servises import get_shopping_list
+
+
+def test_shopping_list_in_base_units(db):
+    user = User.objects.create(
+        username='units', email='units@example.com', password='!')
+    flour = Ingredient.objects.create(
+        name='Мука для теста единиц', measurement_unit='кг')
+    oil = Ingredient.objects.create(
+        name='Масло для теста единиц', measurement_unit='ст. л.')
+    for flour_amount, oil_amount in ((2, 3), (1, 1)):
+        recipe = Recipe.objects.create(
+            name='Блины', author=user, text='-', cooking_time=10)
+        RecipeIngredientAmount.objects.bulk_create([
+            RecipeIngredientAmount(
+                recipe=recipe, ingredient=flour, amount=flour_amount),
+            RecipeIngredientAmount(
+                recipe=recipe, ingredient=oil, amount=oil_amount),
+        ])
+        Shopping.objects.create(user=user, recipe=recipe)
+    assert get_shopping_list(user) == [
+        ('Масло для теста единиц', 'мл', 60),
+        ('Мука для теста единиц', 'г', 3000),
+    ]
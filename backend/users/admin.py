@@ -6,7 +6,8 @@ from .models import User
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = (
-      'pk', 'username', 'first_name', 'last_name', 'email', 'password')
+      'pk', 'username', 'first_name', 'last_name', 'email', 'password',
+      'recipes_count', 'followers_count')
     search_fields = ('username', 'email',)
     list_filter = ('username',)
     empty_value_display = '-пусто-'
@@ -6,7 +6,30 @@ USER = 'user'
 ADMIN = 'admin'
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """Не сохраняет поля counter_fields при обновлении объекта.
+
+    Счетчики меняются UPDATE с F() из сигналов и команд. Полное сохранение
+    вернуло бы в них значения, прочитанные вместе с объектом, и затерло бы
+    изменения, сделанные с тех пор.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
 
     roles = (
         (USER, USER),
@@ -29,6 +52,12 @@ class User(AbstractUser):
         choices=roles,
         max_length=max(len(role[1]) for role in roles), default=USER
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False)
+
+    counter_fields = ('recipes_count', 'followers_count')
 
     REQUIRED_FIELDS = ['email']
     USERNAME_FIELDS = 'email'